@@ -0,0 +1,175 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from services.helpers.func_builder.compiler import Compiler
+from services.helpers.func_builder.dag import dump_derivation, share_derivation
+from services.helpers.func_builder.derivation import write_derivation
+from services.helpers.func_builder.lexer import Lexer, tokenize
+from services.helpers.func_builder.optimizer import fold, optimize
+from services.helpers.func_builder.parser import Parser
+
+
+def arithmetic_chain(terms):
+    return ' + '.join(f'{i} * {i + 1} - {i}' for i in range(terms))
+
+
+def nested_lets(depth):
+    lets = ''.join(f'let x{i} = x{i - 1} + {i} in ' for i in range(1, depth))
+    return f'let x0 = 0 in {lets}x{depth - 1}'
+
+
+def deep_closures(depth):
+    funs = ''.join(f'fun a{i} -> ' for i in range(depth))
+    body = ' + '.join(f'a{i}' for i in range(depth))
+    args = ' '.join(str(i) for i in range(depth))
+    return f'({funs}{body}) {args}'
+
+
+CORPUS = {
+    'arithmetic_chain': arithmetic_chain(50),
+    'nested_lets': nested_lets(100),
+    'twice': 'let twice = fun f -> fun x -> f (f x) in twice (fun x -> x * x) 2',
+    'twice_twice': 'let twice = fun f -> fun x -> f (f x) in twice twice twice (fun x -> x + 1) 0',
+    'factorial': 'let rec fact = fun n -> if n < 1 then 1 else n * fact (n - 1) in fact 20',
+    'fibonacci': 'let rec fib = fun n -> if n < 2 then n else fib (n - 1) + fib (n - 2) in fib 12',
+    'deep_closures': deep_closures(30),
+}
+
+
+# CountingSink stands in for a file so rendering is measured without keeping the text.
+class CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+def count_judgments(derivation):
+    count = 0
+    stack = [derivation]
+    while stack:
+        judgment = stack.pop()
+        count += 1
+        stack.extend(judgment.premises)
+    return count
+
+
+def stages(source):
+    compiler = Compiler(f' |- {source}')
+    _, derivation = compiler.eval_node(compiler.environment, compiler.tree)
+    optimized = optimize(compiler.tree)
+    return {
+        'lex': lambda: tokenize(source),
+        'parse': lambda: Parser(Lexer(source)).program(),
+        'eval': lambda: compiler.eval_value(compiler.environment, compiler.tree),
+        'fold': lambda: fold(compiler.tree, []),
+        'eval_folded': lambda: compiler.eval_value(compiler.environment, optimized),
+        'derive': lambda: compiler.eval_node(compiler.environment, compiler.tree),
+        'render': lambda: write_derivation(derivation, CountingSink()),
+        'share': lambda: share_derivation(derivation),
+    }, derivation
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Allocations are traced on a separate run, since tracing slows the timed ones down.
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'peak_bytes': peak,
+        'retained_bytes': retained,
+    }
+
+
+def run(programs, repeat):
+    results = {}
+    for name in programs:
+        source = CORPUS[name]
+        funcs, derivation = stages(source)
+
+        sink = CountingSink()
+        write_derivation(derivation, sink)
+
+        results[name] = {
+            'source_bytes': len(source),
+            'derivation_bytes': sink.size,
+            'judgments': count_judgments(derivation),
+            'shared_judgments': len(share_derivation(derivation)),
+            'dag_bytes': len(dump_derivation(derivation)),
+            'stages': {stage: measure(func, repeat) for stage, func in funcs.items()},
+        }
+
+    return {
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+# Return (program, stage, baseline, current) for every median time more than threshold slower than baseline.
+def regressions(report, baseline, threshold):
+    slower = []
+    for name, result in report['results'].items():
+        for stage, timing in result['stages'].items():
+            try:
+                before = baseline['results'][name]['stages'][stage]['median_s']
+            except KeyError:
+                continue
+            if timing['median_s'] > before * (1 + threshold):
+                slower.append((name, stage, before, timing['median_s']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the func_builder lexer, parser and compiler.')
+    parser.add_argument('programs', nargs='*', help=f'programs from the corpus to run (default: all of {", ".join(CORPUS)})')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per stage')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fail when a median time is this fraction slower than the baseline')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.programs if name not in CORPUS]
+    if unknown:
+        parser.error(f'unknown programs: {", ".join(unknown)}')
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    report = run(args.programs or list(CORPUS), args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        slower = regressions(report, baseline, args.threshold)
+        for name, stage, before, after in slower:
+            print(f'{name}/{stage}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms', file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
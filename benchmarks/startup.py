@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a service loads at startup. The services import their siblings as top-level modules,
+# so both the repository root and services/ are put on the path.
+MODULES = [
+    'services.helpers.func_builder.compiler',
+    'services.profiler',
+    'services.scheduler',
+    'services.estimator',
+    'controllers.task_runner',
+]
+
+# Libraries that take a long time to import and must only load when first used.
+HEAVY_MODULES = ['torch', 'sklearn', 'scipy', 'docker', 'pandas']
+
+# A line of -X importtime output: "import time:       self [us] |  cumulative | imported package".
+IMPORT_LINE = re.compile(r'import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)')
+
+
+# Import module in a fresh interpreter and return {imported module: cumulative microseconds}.
+def import_times(module):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'services')]))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=ROOT, env=env, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{process.stderr[-2000:]}')
+
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+# Import each module `repeat` times and keep the fastest run, as later runs find the bytecode cached.
+def run(modules, repeat, top):
+    results = {}
+    for module in modules:
+        times = min((import_times(module) for _ in range(repeat)), key=lambda times: times.get(module, 0))
+        heaviest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]
+        results[module] = {
+            'cumulative_ms': times.get(module, 0) / 1e3,
+            'heavy_modules': sorted(name for name in times if name.split('.')[0] in HEAVY_MODULES
+                                    and '.' not in name),
+            'heaviest': [{'module': name, 'cumulative_ms': micros / 1e3} for name, micros in heaviest],
+        }
+    return {
+        'python': sys.version.split()[0],
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+# Return a message for every module over budget or loading a heavy library at import time.
+def violations(report, budget_ms):
+    messages = []
+    for module, result in report['results'].items():
+        if result['cumulative_ms'] > budget_ms:
+            messages.append(f'{module}: {result["cumulative_ms"]:.1f} ms exceeds the {budget_ms:.1f} ms budget')
+        if result['heavy_modules']:
+            messages.append(f'{module}: imports {", ".join(result["heavy_modules"])} at startup')
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold-start import time of the services.')
+    parser.add_argument('modules', nargs='*', help=f'modules to import (default: {", ".join(MODULES)})')
+    parser.add_argument('--repeat', type=int, default=5, help='imports per module; the fastest is kept')
+    parser.add_argument('--top', type=int, default=10, help='number of heaviest imports to list per module')
+    parser.add_argument('--budget-ms', type=float, default=500.0,
+                        help='fail when a module takes longer than this to import')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(args.modules or MODULES, args.repeat, args.top)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    messages = violations(report, args.budget_ms)
+    for message in messages:
+        print(message, file=sys.stderr)
+    return 1 if messages else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,17 @@
+import json
+import math
 import sys
 
-from flask import Flask, request
+from flask import Flask, Response, request
 import threading
 import queue
 import time
 import numpy as np
 from services.scheduler import Scheduler
 from services.estimator import Estimator
+from services.helpers.func_builder.bulk import create_executor, evaluate_bulk
+from services.helpers.func_builder.compiler import EvalMode
+from services.helpers.encoding import receive_matrix
 
 
 app = Flask(__name__)
@@ -18,6 +23,9 @@ estimator = None
 
 lock = threading.Lock()
 
+# Worker processes for bulk evaluation, started on first use
+bulk_executor = None
+
 
 @app.route('/submit_task', methods=['POST'])
 def submit_task():
@@ -33,12 +41,55 @@ def submit_task():
     return "Task submitted!", 202
 
 
+# The body is a potential matrix in the binary format of services/helpers/encoding.py. It is decoded without a copy,
+# and bodies over SPOOL_THRESHOLD bytes are spooled to a temporary file that the estimator reads memory-mapped.
 @app.route('/cluster', methods=['POST'])
 def broadcast_cluster():
-    estimator.enqueue_tensor(request.data)
+    try:
+        tensor = receive_matrix(request.stream, request.content_length)
+    except ValueError as error:
+        return f"Invalid potential matrix: {error}", 400
+    estimator.enqueue_tensor(tensor)
     return "Submission succeeded", 200
 
 
+# Evaluate a JSON body {"programs": [...], "mode": "value", "timeout": 10, "chunk_size": 16}
+# and stream one JSON result per line as the programs finish.
+@app.route('/evaluate_bulk', methods=['POST'])
+def evaluate_programs():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('programs'), list):
+        return "Expected a JSON object with a list of programs", 400
+    try:
+        mode = EvalMode[str(body.get('mode', 'value')).upper()]
+        chunk_size = int(body.get('chunk_size', 16))
+        timeout = float(body.get('timeout', 10))
+    except (KeyError, TypeError, ValueError) as error:
+        return f"Invalid request: {error}", 400
+    if chunk_size < 1:
+        return "chunk_size must be at least 1", 400
+    if not (timeout > 0 and math.isfinite(timeout)):
+        return "timeout must be a positive number of seconds", 400
+    if not all(isinstance(program, str) for program in body['programs']):
+        return "Every program must be a string", 400
+
+    results = evaluate_bulk(body['programs'], mode, chunk_size=chunk_size, timeout=timeout,
+                            executor=get_bulk_executor())
+    return Response((json.dumps(result) + '\n' for result in results), mimetype='application/x-ndjson')
+
+
+# A pool whose worker died is broken for good, so it is replaced for the next request.
+def get_bulk_executor():
+    global bulk_executor
+    with lock:
+        if bulk_executor is not None and bulk_executor._broken:
+            bulk_executor.shutdown(wait=False)
+            bulk_executor = None
+        if bulk_executor is None:
+            bulk_executor = create_executor()
+        return bulk_executor
+
+
 def execute_task(task_data):
     # Simulate a task by sleeping; replace with actual task logic
     time.sleep(5)
@@ -1,4 +1,3 @@
-import docker
 from profiler import *
 
 
@@ -7,6 +6,8 @@ def queue_task(task):
     Each time this function is called, a new Docker container is created
     to run the compiled profiler code.
     """
+    # docker is imported on first use so that importing this module stays cheap
+    import docker
 
     with Profiler(task) as profiler:
 
@@ -1,68 +1,195 @@
-import queue
+import collections
+import logging
 import threading
-import time
-from statistics import LinearRegression
+from concurrent.futures.process import BrokenProcessPool
 
-import torch
 import numpy as np
-from sklearn.decomposition import PCA
-from scipy.sparse.csgraph import laplacian
-from dockernizer import *
-from sklearn.pipeline import Pipeline
+from helpers.batching import MicroBatcher
+from helpers.content_cache import EmbeddingCache, content_key
 from helpers.func_builder.compiler import *
+from helpers.nystrom import LandmarkSampling, nystrom_embedding, use_landmarks
+from helpers.parallel import create_executor, parallel_embeddings
+from helpers.reduction import StreamingReducer
+from helpers.spectral import DENSE_THRESHOLD, EigenSolver, SpectralTracker, batched_embeddings, laplacian_embedding
+
+# scikit-learn, SciPy and docker take seconds to import, so they are imported where they are first used.
+
+logger = logging.getLogger(__name__)
+
+# Warm starts are kept for this many tensor shapes, the most recently used ones.
+TRACKED_SHAPES = 8
 
 
 class Estimator:
-    def __init__(self, cluster_size):
-        self.potential_tensor = np.array([])
+    def __init__(self, cluster_size, eigenpairs=None, solver=EigenSolver.EIGSH, dense_threshold=DENSE_THRESHOLD,
+                 warm_start=True, tol=1e-6, perturbation_threshold=1e-2, max_batch=64, max_wait=5.0, min_linger=0.05,
+                 n_components=None, workers=0, blas_threads=1, landmarks=None, sampling=LandmarkSampling.UNIFORM,
+                 cache_bytes=256 * 1024 * 1024):
+        self.potential_tensor = np.array([], dtype=np.float32)
         self.cluster_size = cluster_size
-        self.potential_tensor_queue = queue.Queue()
+        self.eigenpairs = eigenpairs  # Eigenvectors kept for the embedding; defaults to the tensor's ndim.
+        self.solver = solver
+        self.dense_threshold = dense_threshold  # Graphs up to this size use a dense eigh.
+
+        # With warm_start and the EIGSH solver, each embedding starts from the last one of a tensor of the same shape,
+        # which only pays off when each shape is a single stream of a slowly changing graph; other solvers always
+        # start cold. Each tracker's history records the work per cycle
+        self.warm_start = warm_start
+        self.tol = tol
+        self.perturbation_threshold = perturbation_threshold
+        self.trackers = collections.OrderedDict()  # shape -> SpectralTracker, least recently used first
+
+        # With landmarks, dense tensors with more nodes are embedded from that many sampled nodes (Nyström) instead
+        # of solved exactly; helpers.nystrom.nystrom_error measures the error of a landmark count
+        self.landmarks = landmarks
+        self.sampling = sampling
+
+        # Embeddings are cached by the content hash of their tensor, within cache_bytes; cache.stats() reports the
+        # hit rate and the repeats dropped within a batch
+        self.cache = EmbeddingCache(cache_bytes)
+
+        # Principal components are updated with every embedding; the potential is the mean of a batch's projections
+        self.reducer = StreamingReducer(n_components)
+
+        # Tensors are processed in batches of up to max_batch, flushed after max_wait or once none arrived for
+        # min_linger; batcher.history and batcher.stats() report batch sizes and wait times
+        self.batcher = MicroBatcher(max_batch, max_wait, min_linger)
+        self.worker = None
+        self._lock = threading.Lock()
+
+        # With workers, batches are embedded by a pool of that many processes, which receive the matrices through
+        # shared memory and run with blas_threads BLAS threads each; the pool starts with the first batch.
+        # Pool workers keep no state between batches, so warm starts only apply when workers is 0.
+        self.workers = workers
+        self.blas_threads = blas_threads
+        self.executor = None
         self.lambda_func = None
 
         self.processing = threading.Event()  # An event to track if processing is ongoing
 
     def enqueue_tensor(self, potential_tensor):
-        self.potential_tensor_queue.put(potential_tensor)
+        self.batcher.put(potential_tensor)
 
-        # If processing is not ongoing, start processing
-        if not self.processing.is_set():
-            threading.Thread(target=self.processing_tensor).start()
+        # The first tensor starts the worker, which then keeps waiting for batches
+        with self._lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, daemon=True)
+                self.worker.start()
 
-    def processing_tensor(self):
-        self.processing.set()  # Mark processing as ongoing
+    # A batch that fails is logged and dropped, so that one bad tensor does not stop the worker
+    def run(self):
+        while not self.batcher.closed:
+            try:
+                self.processing_tensor(block=True)
+            except Exception:
+                logger.exception('Failed to process a batch of potential tensors')
 
-        # Wait for 5 seconds to accumulate tensors
-        time.sleep(5)
+    def stop(self):
+        self.batcher.close()
+        with self._lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
 
-        initial_count = self.potential_tensor_queue.qsize()  # Number of tensors at the start of processing
+    def get_executor(self):
+        with self._lock:
+            if self.executor is None:
+                self.executor = create_executor(self.workers, self.blas_threads)
+            return self.executor
 
-        stacked_tensors = torch.stack([])
-        for _ in range(initial_count):
-            tensor = self.potential_tensor_queue.get()
-            lap = laplacian(tensor, normed=True)
-            eigenvalues, eigenvectors = np.linalg.eigh(lap)
-            # Use appropriate number of eigenvectors
-            embedded_data = eigenvectors[:, :tensor.ndim]
+    # A pool whose worker died takes no more tasks; dropping it lets get_executor start a new one.
+    def discard_executor(self, executor):
+        with self._lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
 
-            # PCA
-            pca = PCA(n_components=0.95)
-            reduced_data_pca = pca.fit_transform(embedded_data)
-            stacked_tensors = torch.cat([stacked_tensors, reduced_data_pca])
+    # Process the next batch of tensors. Unless block is set, give up if none arrives within max_wait.
+    def processing_tensor(self, block=False):
+        tensors = self.batcher.get_batch(None if block else self.batcher.max_wait)
+        if not tensors:
+            return
 
-        self.potential_tensor = torch.mean(stacked_tensors, dim=0)
+        self.processing.set()  # Mark processing as ongoing
+        try:
+            self.process_batch(tensors)
+        finally:
+            self.processing.clear()  # Mark processing as done
+
+    def process_batch(self, tensors):
+        # A tensor repeated within the batch is a re-broadcast that adds nothing, so only its first copy is kept
+        unique = {}  # content key -> tensor, in arrival order
+        for tensor in tensors:
+            unique.setdefault(content_key(tensor), tensor)
+        self.cache.add_duplicates(len(tensors) - len(unique))
 
-        # If there are more tensors, start a new processing cycle
-        if not self.potential_tensor_queue.empty():
-            self.processing_tensor()
+        embeddings = {}
+        for key in unique:
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                embeddings[key] = embedding
+        missing = [key for key in unique if key not in embeddings]
+
+        # Small tensors of the same shape are decomposed in one batch; larger ones use the sparse solver
+        count = self.eigenpairs or 2  # tensor.ndim of a matrix, as before
+        pending = [unique[key] for key in missing]
+        if not pending:
+            computed = []
+        elif self.workers:
+            computed = self.parallel_batch(pending, count)
         else:
-            self.processing.clear()  # Mark processing as done
+            computed = batched_embeddings(pending, count, self.dense_threshold, self.embed)
+        for key, embedding in zip(missing, computed):
+            self.cache.put(key, embedding)
+            embeddings[key] = embedding
+
+        self.reducer.reset()
+        for key in unique:
+            self.reducer.add(embeddings[key])
+        self.potential_tensor = self.reducer.mean()
+
+    # Embed tensors in the worker pool. If a worker dies, for example killed for running out of memory, the pool is
+    # replaced for the next batch and this one is embedded in this process instead.
+    def parallel_batch(self, tensors, count):
+        executor = self.get_executor()
+        try:
+            return parallel_embeddings(executor, tensors, count, self.workers, self.dense_threshold, self.solver,
+                                       self.landmarks, self.sampling)
+        except BrokenProcessPool:
+            logger.warning('An embedding worker died; embedding the batch in process and restarting the pool')
+            self.discard_executor(executor)
+            return batched_embeddings(tensors, count, self.dense_threshold, self.embed)
+
+    # Only the eigenvectors of the smallest eigenvalues are used, so they are solved for directly
+    def embed(self, tensor):
+        count = self.eigenpairs or tensor.ndim
+        if use_landmarks(tensor, self.landmarks):
+            return nystrom_embedding(tensor, count, self.landmarks, self.sampling)
+        if self.warm_start and self.solver == EigenSolver.EIGSH:
+            return self.tracker(tensor.shape).update(tensor, count)[1]
+        return laplacian_embedding(tensor, count, self.solver, self.dense_threshold)
+
+    # Return the warm-start tracker of tensors of shape, forgetting the least recently used shape past TRACKED_SHAPES.
+    def tracker(self, shape):
+        tracker = self.trackers.get(shape)
+        if tracker is None:
+            tracker = SpectralTracker(self.tol, self.perturbation_threshold, dense_threshold=self.dense_threshold)
+            self.trackers[shape] = tracker
+            if len(self.trackers) > TRACKED_SHAPES:
+                self.trackers.popitem(last=False)
+        self.trackers.move_to_end(shape)
+        return tracker
 
     def build_estimator(self, task):
+        from dockernizer import queue_task
+        from sklearn.linear_model import LinearRegression
+        from sklearn.pipeline import Pipeline
+
         profile = queue_task(task)
         model = Pipeline([
             ('tfidf', Compiler()),
             ('regressor', LinearRegression())
         ])
 
-        # Build the lambda function from string
-        self.lambda_func = eval(model.fit_predict(profile))
+        # Compile the cost-model program into a Python callable
+        self.lambda_func = Compiler.eval_expr('', model.fit_predict(profile), EvalMode.NATIVE)[0]
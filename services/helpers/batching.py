@@ -0,0 +1,83 @@
+import collections
+import threading
+import time
+
+
+# MicroBatcher collects items put from any thread and hands them to consumers in batches.
+# A batch is flushed as soon as one of these holds:
+# - max_batch items are waiting;
+# - max_wait seconds have passed since its first item arrived;
+# - no item arrived for min_linger seconds, so a lone update waits min_linger instead of the whole window.
+# Waiting is done on a condition variable, so producers never poll or start threads.
+class MicroBatcher:
+    def __init__(self, max_batch=64, max_wait=5.0, min_linger=0.05, history=1000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.min_linger = min_linger
+
+        self.items = collections.deque()  # (arrival time, item)
+        self.last_arrival = None
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.history = collections.deque(maxlen=history)  # {'size', 'wait', 'reason'} per flushed batch
+        self.batches = 0
+        self.flushed = 0
+
+    def put(self, item):
+        with self.condition:
+            self.last_arrival = time.monotonic()
+            self.items.append((self.last_arrival, item))
+            self.condition.notify()
+
+    # Wake every waiting consumer; a batch already started is flushed, and later calls return [] at once.
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    # Block until a batch is ready and return its items, oldest first. Return [] if no item arrived within
+    # timeout seconds (None waits for ever) or the batcher was closed with nothing waiting.
+    def get_batch(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout) or not self.items:
+                return []
+
+            while True:
+                now = time.monotonic()
+                first_arrival = self.items[0][0]
+                if len(self.items) >= self.max_batch:
+                    reason = 'full'
+                elif self.closed:
+                    reason = 'closed'
+                elif now >= first_arrival + self.max_wait:
+                    reason = 'max_wait'
+                elif now >= self.last_arrival + self.min_linger:
+                    reason = 'linger'
+                else:
+                    self.condition.wait(min(first_arrival + self.max_wait, self.last_arrival + self.min_linger) - now)
+                    continue
+                break
+
+            size = min(len(self.items), self.max_batch)
+            batch = [self.items.popleft()[1] for _ in range(size)]
+            self.history.append({'size': size, 'wait': now - first_arrival, 'reason': reason})
+            self.batches += 1
+            self.flushed += size
+
+            # Items left over from a full batch are the start of the next one.
+            if self.items:
+                self.condition.notify()
+            return batch
+
+    def stats(self):
+        with self.condition:
+            waits = [record['wait'] for record in self.history]
+            return {
+                'batches': self.batches,
+                'items': self.flushed,
+                'pending': len(self.items),
+                'mean_size': self.flushed / self.batches if self.batches else 0.0,
+                'mean_wait': sum(waits) / len(waits) if waits else 0.0,
+                'max_wait': max(waits, default=0.0),
+            }
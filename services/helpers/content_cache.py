@@ -0,0 +1,98 @@
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+# xxHash is several times faster than BLAKE2 on large buffers; BLAKE2 from hashlib is used when it is not installed.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# Return a 16-byte digest of the content of matrix: its layout, dtype and shape, then the raw bytes of its arrays
+# (the data, indices and indptr of a scipy.sparse matrix). For a matrix decoded from a /cluster body these are the
+# sections of the body itself, so equal bodies give equal keys; the buffers are hashed in place, without copies.
+def content_key(matrix):
+    digest = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    if hasattr(matrix, 'tocsr'):
+        matrix = matrix.tocsr()
+        arrays = [matrix.data, matrix.indices, matrix.indptr]
+        layout = 'csr'
+    else:
+        arrays = [np.asarray(matrix)]
+        layout = 'dense'
+
+    digest.update(f'{layout}:{matrix.shape}:{",".join(array.dtype.str for array in arrays)}'.encode())
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+    return digest.digest()
+
+
+# EmbeddingCache keeps the embeddings of recent matrices by content key, evicting the least recently used ones
+# once their arrays take more than max_bytes. An embedding is often a view of a much larger eigenvector array,
+# so a compact copy is stored, and max_bytes bounds what the cache keeps alive. Cached arrays are made read-only,
+# as they are shared by every hit.
+class EmbeddingCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        self.entries = collections.OrderedDict()  # content key -> embedding
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.duplicates = 0  # Repeats dropped within a batch before lookup, counted by the caller
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            embedding = self.entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key, embedding):
+        embedding = np.array(embedding, copy=True)
+        embedding.flags.writeable = False
+
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.nbytes
+            self.entries[key] = embedding
+            self.size += embedding.nbytes
+
+            while self.entries and self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+                self.evictions += 1
+
+    def add_duplicates(self, count):
+        with self._lock:
+            self.duplicates += count
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'duplicates': self.duplicates,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self.entries)
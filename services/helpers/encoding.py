@@ -0,0 +1,171 @@
+import io
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+# Binary format of a potential matrix sent to /cluster. All integers are little-endian.
+#   offset  size  field
+#   0       4     magic b'PMX1'
+#   4       1     layout: 0 dense, 1 CSR
+#   5       1     value dtype code (DTYPES)
+#   6       1     index dtype code for CSR, 0 for dense
+#   7       1     ndim: number of dimensions, always 2; the matrix must be square
+#   8       8*k   uint64 shape, one per dimension; CSR adds a uint64 count of stored entries
+# The header is padded with zero bytes to a multiple of 8, and so is every section after it:
+#   dense:  the values in C order
+#   CSR:    data (nnz values), indices (nnz indexes), indptr (rows + 1 indexes)
+# Sections start 8-byte aligned, so np.frombuffer and np.memmap can view them in place.
+MAGIC = b'PMX1'
+HEADER = struct.Struct('<4sBBBB')
+
+DENSE = 0
+CSR = 1
+
+DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f8'),
+    3: np.dtype('<i4'),
+    4: np.dtype('<i8'),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+# Payloads larger than this are written to a temporary file and memory-mapped instead of read into memory.
+SPOOL_THRESHOLD = 16 * 1024 * 1024
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def dtype_code(dtype):
+    try:
+        return DTYPE_CODES[np.dtype(dtype).newbyteorder('<')]
+    except KeyError:
+        raise ValueError(f'Unsupported dtype: {dtype}')
+
+
+# Write matrix, a NumPy array or a scipy.sparse matrix (sent as CSR), to a binary stream.
+def write_matrix(matrix, stream):
+    if hasattr(matrix, 'tocsr'):
+        matrix = matrix.tocsr()
+        index_dtype = np.result_type(matrix.indices, matrix.indptr)
+        sections = [matrix.data, matrix.indices.astype(index_dtype, copy=False),
+                    matrix.indptr.astype(index_dtype, copy=False)]
+        header = HEADER.pack(MAGIC, CSR, dtype_code(matrix.dtype), dtype_code(index_dtype), 2)
+        header += struct.pack('<3Q', matrix.shape[0], matrix.shape[1], matrix.nnz)
+    else:
+        matrix = np.asarray(matrix)
+        sections = [matrix]
+        header = HEADER.pack(MAGIC, DENSE, dtype_code(matrix.dtype), 0, matrix.ndim)
+        header += struct.pack(f'<{matrix.ndim}Q', *matrix.shape)
+
+    stream.write(header + bytes(align(len(header)) - len(header)))
+    for section in sections:
+        data = np.ascontiguousarray(section, dtype=section.dtype.newbyteorder('<')).reshape(-1).view(np.uint8)
+        stream.write(data)
+        stream.write(bytes(align(len(data)) - len(data)))
+
+
+def encode_matrix(matrix):
+    stream = io.BytesIO()
+    write_matrix(matrix, stream)
+    return stream.getvalue()
+
+
+# Return (layout, dtype, index dtype, shape, nnz, payload offset) from the start of an encoded matrix.
+def read_header(buffer):
+    if len(buffer) < HEADER.size:
+        raise ValueError('Truncated header')
+    magic, layout, code, index_code, ndim = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError('Not a potential matrix')
+    if layout not in (DENSE, CSR) or code not in DTYPES or (layout == CSR and (index_code not in DTYPES or ndim != 2)):
+        raise ValueError('Invalid header')
+
+    count = ndim + 1 if layout == CSR else ndim
+    if len(buffer) < HEADER.size + 8 * count:
+        raise ValueError('Truncated header')
+    fields = struct.unpack_from(f'<{count}Q', buffer, HEADER.size)
+    shape = fields[:ndim]
+    if ndim != 2 or shape[0] != shape[1]:
+        raise ValueError(f'Expected a square matrix, got shape {shape}')
+    nnz = fields[ndim] if layout == CSR else None
+    index_dtype = DTYPES[index_code] if layout == CSR else None
+    return layout, DTYPES[code], index_dtype, shape, nnz, align(HEADER.size + 8 * count)
+
+
+# Return the sections of an encoded matrix as (dtype, count, offset), checking that they fit in size bytes.
+def sections(layout, dtype, index_dtype, shape, nnz, offset, size):
+    if layout == DENSE:
+        layout_sections = [(dtype, int(np.prod(shape, dtype=np.int64)))]
+    else:
+        layout_sections = [(dtype, nnz), (index_dtype, nnz), (index_dtype, shape[0] + 1)]
+
+    result = []
+    for section_dtype, count in layout_sections:
+        result.append((section_dtype, count, offset))
+        offset = align(offset + section_dtype.itemsize * count)
+    if offset > align(size):
+        raise ValueError('Truncated payload')
+    return result
+
+
+# Decode an encoded matrix without copying it: arrays are read-only views of buffer, which must stay alive.
+# Dense matrices come back as NumPy arrays and CSR ones as scipy.sparse.csr_matrix.
+def decode_matrix(buffer):
+    layout, dtype, index_dtype, shape, nnz, offset = read_header(buffer)
+    views = [np.frombuffer(buffer, section_dtype, count, section_offset)
+             for section_dtype, count, section_offset in sections(layout, dtype, index_dtype, shape, nnz, offset,
+                                                                  len(buffer))]
+    return assemble(layout, shape, views)
+
+
+# Build the matrix from its section views, checking that CSR indexes are in range so that the solvers can trust them.
+def assemble(layout, shape, views):
+    if layout == DENSE:
+        return views[0].reshape(shape)
+
+    _, indices, indptr = views
+    if indptr[0] != 0 or indptr[-1] != len(indices) or np.any(indptr[1:] < indptr[:-1]):
+        raise ValueError('Invalid CSR indptr')
+    if len(indices) and (indices.min() < 0 or indices.max() >= shape[1]):
+        raise ValueError('CSR indices out of range')
+
+    import scipy.sparse as sp
+
+    return sp.csr_matrix(tuple(views), shape=shape, copy=False)
+
+
+# Decode a matrix that has been written to a file, mapping its sections into memory instead of reading them.
+def map_matrix(file):
+    file.seek(0)
+    header = file.read(HEADER.size + 8 * 256)
+    layout, dtype, index_dtype, shape, nnz, offset = read_header(header)
+    file.seek(0, 2)
+    size = file.tell()
+    views = [np.memmap(file, section_dtype, 'r', section_offset, (count,)) if count else empty(section_dtype)
+             for section_dtype, count, section_offset in sections(layout, dtype, index_dtype, shape, nnz, offset,
+                                                                  size)]
+    return assemble(layout, shape, views)
+
+
+# np.memmap cannot map an empty section; it is read-only like the mapped ones.
+def empty(dtype):
+    array = np.empty(0, dtype)
+    array.flags.writeable = False
+    return array
+
+
+# Read an encoded matrix of length bytes from a binary stream, such as a request body.
+# Payloads up to spool_threshold are decoded in place from the bytes read; larger ones are copied in chunks
+# to an anonymous temporary file and memory-mapped, so the matrix is paged in as the estimator reads it.
+def receive_matrix(stream, length=None, spool_threshold=SPOOL_THRESHOLD, spool_dir=None):
+    if length is None or length <= spool_threshold:
+        return decode_matrix(stream.read() if length is None else stream.read(length))
+
+    spool = tempfile.TemporaryFile(dir=spool_dir)
+    shutil.copyfileobj(stream, spool, 1024 * 1024)
+    spool.flush()
+    return map_matrix(spool)
@@ -0,0 +1,120 @@
+import concurrent.futures
+import itertools
+import os
+import signal
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+from services.helpers.func_builder.compiler import Compiler, EvalMode
+from services.helpers.func_builder.derivation import render_derivation
+from services.helpers.func_builder.memo import JudgmentCache
+from services.helpers.func_builder.values import format_value
+
+# Judgment cache of the current worker process, shared by every program it evaluates.
+worker_cache = None
+
+
+def init_worker(recursion_limit, cache_entries):
+    global worker_cache
+    sys.setrecursionlimit(recursion_limit)
+    if cache_entries:
+        worker_cache = JudgmentCache(max_entries=cache_entries)
+
+
+def raise_timeout(signum, frame):
+    raise TimeoutError('Evaluation timed out')
+
+
+# Evaluate one program and return a picklable result: the value and derivation as text, or the error.
+# The timeout uses SIGALRM, so it is only enforced where the platform has it and in a process's main thread.
+# Anything that goes wrong, including a program that is not a string or a timeout setitimer rejects, fails
+# this program alone, and the previous SIGALRM handler is always put back.
+def evaluate_program(index, program, mode, timeout):
+    alarm = timeout is not None and hasattr(signal, 'setitimer')
+    installed = False
+    try:
+        if not isinstance(program, str):
+            raise TypeError(f'Expected a program string, got {type(program).__name__}')
+        if '|-' not in program:
+            program = f' |- {program}'
+
+        if alarm:
+            previous = signal.signal(signal.SIGALRM, raise_timeout)
+            installed = True
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        value, derivation = Compiler(program, mode, worker_cache).evaluate()
+        return {
+            'index': index,
+            'value': format_value(value),
+            'derivation': None if derivation is None else render_derivation(derivation),
+            'error': None,
+        }
+    except (Exception, SystemExit) as error:
+        # The parser reports syntax errors by exiting.
+        return failure(index, error)
+    finally:
+        if installed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def evaluate_chunk(chunk, mode, timeout):
+    return [evaluate_program(index, program, mode, timeout) for index, program in chunk]
+
+
+# Evaluate many independent programs across worker processes and yield their results in completion order.
+# Each result is a dict with the program's position in programs, its value and derivation as text, and error.
+# Programs are sent in chunks of chunk_size, with at most two chunks per worker in flight, so programs may be
+# a lazy iterable. timeout bounds each program's evaluation in seconds. Pass an executor to reuse its workers;
+# otherwise a pool of `workers` processes is started and shut down here.
+def evaluate_bulk(programs, mode=EvalMode.VALUE, workers=None, chunk_size=16, timeout=10.0, executor=None,
+                  recursion_limit=10000, cache_entries=4096):
+    if executor is None:
+        with create_executor(workers, recursion_limit, cache_entries) as executor:
+            yield from evaluate_bulk(programs, mode, workers, chunk_size, timeout, executor)
+        return
+
+    numbered = enumerate(programs)
+    pending = {}
+    broken = None
+
+    # Submit the next chunk; once the pool is broken, return its programs as failed instead.
+    def submit():
+        nonlocal broken
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if chunk and broken is None:
+            try:
+                pending[executor.submit(evaluate_chunk, chunk, mode, timeout)] = chunk
+                return []
+            except BrokenProcessPool as error:
+                broken = error
+        return [failure(index, broken) for index, _ in chunk]
+
+    for _ in range(2 * (workers or os.cpu_count() or 1)):
+        yield from submit()
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            chunk = pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as error:
+                # The worker died, for example from running out of memory; report every program it held.
+                results = [failure(index, error) for index, _ in chunk]
+            yield from submit()
+            yield from results
+
+    # A broken pool takes no more chunks, so the programs not read yet are reported as failed too.
+    if broken is not None:
+        for index, _ in numbered:
+            yield failure(index, broken)
+
+
+def failure(index, error):
+    return {'index': index, 'value': None, 'derivation': None, 'error': f'{type(error).__name__}: {error}'}
+
+
+def create_executor(workers=None, recursion_limit=10000, cache_entries=4096):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                  initargs=(recursion_limit, cache_entries))
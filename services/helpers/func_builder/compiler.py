@@ -1,270 +1,370 @@
-import regex
-from collections import OrderedDict
+import enum
+import functools
 
+from services.helpers.func_builder.derivation import *
 from services.helpers.func_builder.lexer import Lexer
+from services.helpers.func_builder.native import compile_native
+from services.helpers.func_builder.nodes import *
+from services.helpers.func_builder.optimizer import optimize
 from services.helpers.func_builder.parser import Parser
+from services.helpers.func_builder.values import *
 
 
-def strip_surrounding_parentheses(s):
-    # Check if the string starts with "(" and ends with ")"
-    if s.startswith('(') and s.endswith(')'):
-        # Check if the string minus the outermost parentheses is balanced
-        inner = s[1:-1]
-        if inner.count('(') == inner.count(')'):
-            return inner
-    return s
+# Frames pending on the stack of Compiler.eval_stack.
+FRAME_LEFT = 1  # (tag, BinOp, environment): evaluate the right operand next.
+FRAME_RIGHT = 2  # (tag, BinOp, left value): apply the operator.
+FRAME_FUN = 3  # (tag, App, environment): evaluate the argument next.
+FRAME_ARG = 4  # (tag, function value): apply it.
+FRAME_IF = 5  # (tag, If, environment): evaluate the chosen branch.
+FRAME_LET = 6  # (tag, Let, environment): bind the value and evaluate the body.
+
+
+# EvalMode selects what the Compiler produces for a program.
+class EvalMode(enum.Enum):
+    DERIVATION = 1  # The value together with its evalto Derivation tree, for auditing.
+    VALUE = 2  # The value only; no derivation text is formatted.
+    NATIVE = 3  # The value only, from the program compiled to Python; functions are returned as Python callables.
+    STACK = 4  # The value only, evaluated on an explicit stack so recursion depth is not bounded by Python's.
 
 
 class Compiler:
-    def __init__(self, program):
+    def __init__(self, program, mode=EvalMode.DERIVATION, cache=None):
         self.program = program
+        self.mode = mode
+        self.cache = cache  # JudgmentCache shared between evaluations, or None.
         self.env, self.expr = self.decompose_program()
+        self.environment = self.parse_environment(self.env)
+        self.tree = self.parse(self.expr, self.environment.names())
 
     def decompose_program(self):
         env = self.program.split('|-')[0].strip()
         expr = self.program.split('|-')[1].strip()
         return env, expr
 
-    def parse_fun_expression(self, fun_expr):
-
-        env_pattern = r'\((?:[^\(\)]|(?R))*\)'
-        fun_patter = r'\[(?:[^\[\]]|(?R))*\]'
-
-        env_match = regex.search(env_pattern, fun_expr)
-        env = env_match.group(0)
-        if len(env) >= 2:
-            env = env[1:-1]
-
-        fun_match = regex.search(fun_patter, fun_expr[env_match.end(0)::])
-        fun = fun_match.group(0)
-        if len(fun) >= 2:
-            fun = fun[1:-1]
-
-        ident, expr = self.parse_fun(fun)
-
-        return env, ident, expr
-
+    # Parse source text into a syntax tree with variables resolved against the names in scope.
+    # The same program is evaluated repeatedly, so trees are shared by source and scope for the most recent ones.
     @staticmethod
-    def parse_fun(fun):
-        pattern = r'fun\s+(\w+)\s+->\s+(.*)'
-        match = regex.match(pattern, fun)
-        if match:
-            ident = match.group(1)
-            expr = match.group(2)
-            return ident, expr
-        return None, None
-
-    def parse_rec_fun_expression(self, rec_fun_expr):
-
-        env_pattern = r'\((?:[^\(\)]|(?R))*\)'
-        fun_patter = r'\[(?:[^\[\]]|(?R))*\]'
-
-        env_match = regex.search(env_pattern, rec_fun_expr)
-        env = env_match.group(0)
-        if len(env) >= 2:
-            env = env[1:-1]
-
-        fun_match = regex.search(fun_patter, rec_fun_expr[env_match.end(0)::])
-        fun = fun_match.group(0)
-        if len(fun) >= 2:
-            fun = fun[1:-1]
-
-        ident_1, ident_2, expr = self.parse_rec_func(fun)
-
-        return env, ident_1, ident_2, expr
-
-    @staticmethod
-    def parse_rec_func(s):
-        pattern = r'rec\s+(\w+)\s+=\s+fun\s+(\w+)\s+->\s+(.*)'
-        match = regex.match(pattern, s)
-        if match:
-            ident_1 = match.group(1)
-            ident_2 = match.group(2)
-            expression = match.group(3)
-
-            return ident_1, ident_2, expression
-        return None, None, None
-
-    @staticmethod
-    def decompose_fun(fun):
-        pass
+    @functools.lru_cache(maxsize=256)
+    def parse(expr, scope=()):
+        return Parser(Lexer(expr), scope).program()
 
+    # Environments are immutable, so one parsed from the same text is shared too; closures in it then keep
+    # the same body trees, which the judgment cache compares by identity.
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def parse_environment(environment):
-        environments = [s.strip() for s in environment.split(',')]
-        od = OrderedDict()
-
-        for env in environments:
-            if env != '':
-                ident = env.split('=', 1)[0].strip()
-                expr = env.split('=', 1)[1].strip()
-                od[ident] = expr
-
-        return od
+        return Parser(Lexer(environment)).environment()
+
+    # Return the value and its Derivation; the derivation is None in value-only mode.
+    # Value and native modes evaluate the optimized tree; derivations are of the program as written. Stack mode
+    # also takes the tree as written, as the optimizer recurses and would fail on the deep programs it is for.
+    def evaluate(self):
+        if self.mode == EvalMode.VALUE:
+            return self.eval_value_cached(self.environment, optimize(self.tree)), None
+        elif self.mode == EvalMode.NATIVE:
+            return compile_native(optimize(self.tree), self.environment), None
+        elif self.mode == EvalMode.STACK:
+            return self.eval_stack(self.environment, self.tree), None
+        return self.eval_cached(self.environment, self.tree)
+
+    # Evaluate node in derivation mode, reusing a cached judgment when the cache keeps derivations.
+    def eval_cached(self, environment, node):
+        cache = self.cache
+        if cache is None or not cache.derivations:
+            return self.eval_node(environment, node)
+        key = cache.key(environment, node)
+        entry = cache.get(key, derivation=True)
+        if entry is not None:
+            return entry
+        value, derivation = self.eval_node(environment, node)
+        cache.put(key, value, derivation)
+        return value, derivation
+
+    def eval_value_cached(self, environment, node):
+        cache = self.cache
+        if cache is None:
+            return self.eval_value(environment, node)
+        key = cache.key(environment, node)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        value = self.eval_value(environment, node)
+        cache.put(key, value)
+        return value
+
+    def eval_node(self, environment, node):
+        kind = type(node)
+        if kind is BinOp:
+            if node.op == OpType.PLUS:
+                return self.eval_plus(environment, node)
+            elif node.op == OpType.MINUS:
+                return self.eval_minus(environment, node)
+            elif node.op == OpType.ASTERISK:
+                return self.eval_times(environment, node)
+            return self.eval_lt(environment, node)
+        elif kind is Var:
+            return self.eval_var(environment, node)
+        elif kind is Int:
+            return self.eval_int(environment, node)
+        elif kind is App:
+            return self.eval_app_base(environment, node)
+        elif kind is If:
+            return self.eval_if(environment, node)
+        elif kind is Let:
+            return self.eval_let(environment, node)
+        elif kind is Fun:
+            return self.eval_fun(environment, node)
+        elif kind is LetRec:
+            return self.eval_let_rec(environment, node)
+        elif kind is Bool:
+            return self.eval_bool(environment, node)
+        raise TypeError(f'Unknown node: {node!r}')
+
+    # Value-only evaluation; nothing is formatted as text.
+    def eval_value(self, environment, node):
+        kind = type(node)
+        if kind is BinOp:
+            value_1 = self.eval_value(environment, node.left)
+            value_2 = self.eval_value(environment, node.right)
+            if node.op == OpType.PLUS:
+                return value_1 + value_2
+            elif node.op == OpType.MINUS:
+                return value_1 - value_2
+            elif node.op == OpType.ASTERISK:
+                return value_1 * value_2
+            return value_1 < value_2
+        elif kind is Var:
+            return environment.lookup(self.index_of(environment, node))
+        elif kind is Int or kind is Bool:
+            return node.value
+        elif kind is App:
+            closure = self.eval_value(environment, node.fun)
+            value = self.eval_value(environment, node.arg)
+            if type(closure) is RecClosure:
+                new_env = closure.environment.extend(closure.name, closure).extend(closure.param, value)
+                return self.eval_value_cached(new_env, closure.body)
+            elif type(closure) is Closure:
+                return self.eval_value_cached(closure.environment.extend(closure.param, value), closure.body)
+            raise TypeError(f'{node.fun} evaluates to {format_value(closure)}, which is not a function')
+        elif kind is If:
+            if self.eval_value(environment, node.cond) is True:
+                return self.eval_value(environment, node.then)
+            return self.eval_value(environment, node.orelse)
+        elif kind is Let:
+            value = self.eval_value(environment, node.bound)
+            return self.eval_value(environment.extend(node.name, value), node.body)
+        elif kind is Fun:
+            return Closure(environment, node.param, node.body)
+        elif kind is LetRec:
+            closure = RecClosure(environment, node.name, node.param, node.fun_body)
+            return self.eval_value(environment.extend(node.name, closure), node.body)
+        raise TypeError(f'Unknown node: {node!r}')
+
+    # Value-only evaluation without Python recursion. Pending work is kept as frames on an explicit stack:
+    # a node is evaluated down to a value, then frames are popped until one has another node to evaluate.
+    # An application pushes nothing for the call itself, so tail calls such as a let rec loop run in constant stack.
+    def eval_stack(self, environment, node):
+        stack = []
+        while True:
+            kind = type(node)
+            if kind is BinOp:
+                stack.append((FRAME_LEFT, node, environment))
+                node = node.left
+                continue
+            elif kind is Var:
+                value = environment.lookup(self.index_of(environment, node))
+            elif kind is Int or kind is Bool:
+                value = node.value
+            elif kind is App:
+                stack.append((FRAME_FUN, node, environment))
+                node = node.fun
+                continue
+            elif kind is If:
+                stack.append((FRAME_IF, node, environment))
+                node = node.cond
+                continue
+            elif kind is Let:
+                stack.append((FRAME_LET, node, environment))
+                node = node.bound
+                continue
+            elif kind is Fun:
+                value = Closure(environment, node.param, node.body)
+            elif kind is LetRec:
+                environment = environment.extend(node.name,
+                                                 RecClosure(environment, node.name, node.param, node.fun_body))
+                node = node.body
+                continue
+            else:
+                raise TypeError(f'Unknown node: {node!r}')
+
+            # Hand the value to pending frames until one of them continues with another node.
+            while True:
+                if not stack:
+                    return value
+
+                frame = stack.pop()
+                tag = frame[0]
+                if tag == FRAME_RIGHT:
+                    _, node, value_1 = frame
+                    if node.op == OpType.PLUS:
+                        value = value_1 + value
+                    elif node.op == OpType.MINUS:
+                        value = value_1 - value
+                    elif node.op == OpType.ASTERISK:
+                        value = value_1 * value
+                    else:
+                        value = value_1 < value
+                    continue
+                elif tag == FRAME_LEFT:
+                    _, node, environment = frame
+                    stack.append((FRAME_RIGHT, node, value))
+                    node = node.right
+                elif tag == FRAME_FUN:
+                    _, node, environment = frame
+                    stack.append((FRAME_ARG, value))
+                    node = node.arg
+                elif tag == FRAME_ARG:
+                    closure = frame[1]
+                    if type(closure) is RecClosure:
+                        environment = closure.environment.extend(closure.name, closure).extend(closure.param, value)
+                    elif type(closure) is Closure:
+                        environment = closure.environment.extend(closure.param, value)
+                    else:
+                        raise TypeError(f'{format_value(closure)} is not a function')
+                    node = closure.body
+                elif tag == FRAME_IF:
+                    _, node, environment = frame
+                    node = node.then if value is True else node.orelse
+                else:
+                    _, node, environment = frame
+                    environment = environment.extend(node.name, value)
+                    node = node.body
+                break
+
+    # Variables are resolved when the tree is parsed; one evaluated somewhere else is found by name.
+    @staticmethod
+    def index_of(environment, expr):
+        if expr.index is None:
+            return environment.index(expr.name)
+        return expr.index
 
     @staticmethod
     def eval_int(environment, expr):
-        value = expr
-        evalto = f'{environment} |- {expr} evalto {value} by E-Int{{}};\n'
-        return value, evalto
+        value = expr.value
+        return value, Derivation(environment, expr, value, 'E-Int')
 
     @staticmethod
     def eval_bool(environment, expr):
-        value = expr
-        evalto = f'{environment} |- {expr} evalto {value} by E-bool{{}};\n'
-        return value, evalto
+        value = expr.value
+        return value, Derivation(environment, expr, value, 'E-Bool')
 
+    # Build E-Var2 steps out to the binding, then E-Var1 for the binding itself.
     def eval_var(self, environment, expr):
-        env_od = self.parse_environment(environment)
-        key = list(env_od.items())[-1][0]
-        if key.strip() == expr:
-            return self.eval_var1(environment, expr)
-        else:
-            return self.eval_var2(environment, expr)
-
-    def eval_var1(self, environment, expr):
-        env_od = self.parse_environment(environment)
-        value = list(env_od.items())[-1][1]
-        evalto = f'{environment} |- {expr} evalto {value} by E-Var1{{}};\n'
-        return value, evalto
-
-    def eval_var2(self, environment, expr):
-        new_env_list = [env.strip() for env in environment.split(',')]
-        new_env_list.pop()
-        new_env = ', '.join(new_env_list)
-        value, evalto_1 = self.eval_expr(new_env, expr)
-        evalto = (f'{environment} |- {expr} evalto {value} by E-Var1{{\n'
-                  f'    {evalto_1}'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_plus(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-        value = int(value_1) + int(value_2)
-        evalto = (f'{environment} |- {expr_1} + {expr_2} evalto {value} by E-Plus {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {value_1} plus {value_2} is {value} by B-Plus{{}};'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_minus(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-        value = int(value_1) - int(value_2)
-        evalto = (f'{environment} |- {expr_1} - {expr_2} evalto {value} by E-Minus {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {value_1} minus {value_2} is {value} by B-Minus{{}};'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_times(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-        value = int(value_1) * int(value_2)
-        evalto = (f'{environment} |- {expr_1} * {expr_2} evalto {value} by E-Times {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {value_1} times {value_2} is {value} by B-Times{{}};'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_lt(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-        value = int(value_1) < int(value_2)
-        evalto = (f'{environment} |- {expr_1} < {expr_2} evalto {value} by E-Lt {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {value_1} less than {value_2} is {value} by B-Lt{{}};'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_let(self, environment, ident, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        new_env = ''
-        if environment == '':
-            new_env = f'{ident} = {value_1}'
-        else:
-            new_env = f'{environment}, {ident} = {value_1}'
-
-        value_2, evalto_2 = self.eval_expr(new_env, expr_2)
-        evalto = (f'{environment} |- let {ident} = {expr_1} in {expr_2} evalto {value_2} by E-Let {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'}};\n')
-        return value_2, evalto
-
-    def eval_if(self, environment, expr_1, expr_2, expr_3):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        if bool(value_1):
-            value, evalto_2 = self.eval_expr(environment, expr_2)
-            evalto = (f'{environment} |- if {expr_1} then {expr_2} else {expr_3} evalto {value} by E-IfT {{\n'
-                      f'    {evalto_1}'
-                      f'    {evalto_2}'
-                      f'}};\n')
-        else:
-            value, evalto_3 = self.eval_expr(environment, expr_3)
-            evalto = (f'{environment} |- if {expr_1} then {expr_2} else {expr_3} evalto {value} by E-IfF {{\n'
-                      f'    {evalto_1}'
-                      f'    {evalto_3}'
-                      f'}};\n')
-        return value, evalto
+        index = self.index_of(environment, expr)
+        value = environment.lookup(index)
+        value, derivation = self.eval_var1(environment.drop(index), expr, value)
+        for depth in range(index - 1, -1, -1):
+            value, derivation = self.eval_var2(environment.drop(depth), expr, value, derivation)
+        return value, derivation
 
     @staticmethod
-    def eval_fun(environment, ident, expr):
-        value = f'({environment})[fun {ident} -> {expr}]'
-        evalto = f'{environment} |- fun {ident} -> {expr} evalto {value} by E-Fun{{}};\n'
-        return value, evalto
-
-    def eval_app_base(self, environment, expr_1, expr_2):
-        value, _ = self.eval_expr(environment, expr_1)
-        if 'let rec' in value:
-            return self.eval_app_rec(environment, expr_1, expr_2)
-        else:
-            return self.eval_app(environment, expr_1, expr_2)
-
-    def eval_app(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-        env_2, ident, evalto_0 = self.parse_fun_expression(value_1)
-        value, evalto_3 = self.eval_expr(f'{environment}, {ident} = {value_2}', evalto_0)
-        evalto = (f'{environment} |- {expr_1} {expr_2} evalto {value} by E-App {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {evalto_3}'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_let_rec(self, environment, ident_1, ident_2, expr_1, expr_2):
-        value, evalto_1 = self.eval_expr(f'{environment}, {ident_1} = ()[rec {ident_1} = fun {ident_2} -> {expr_1}]', expr_2)
-        evalto = (f'{environment} |- let rec {ident_1} = fun {ident_2} -> {expr_1} in {expr_2} evalto {value} by E-LetRec {{\n'
-                  f'    {evalto_1}'
-                  f'}};\n')
-        return value, evalto
-
-    def eval_app_rec(self, environment, expr_1, expr_2):
-        value_1, evalto_1 = self.eval_expr(environment, expr_1)
-        env_2, ident_1, ident_2, expr_0 = self.parse_rec_fun_expression(value_1)
-        value_2, evalto_2 = self.eval_expr(environment, expr_2)
-
-        value, evalto_3 = self.eval_expr(f'{env_2}, {ident_1} = ({env_2})[rec {ident_1} = fun {ident_2} -> {expr_0}], {ident_2} = {value_2}', expr_0)
-        evalto = (f'{environment} |- {expr_1} {expr_2} evalto {value} by E-AppRec {{\n'
-                  f'    {evalto_1}'
-                  f'    {evalto_2}'
-                  f'    {evalto_3}'
-                  f'}};\n')
-        return value, evalto
+    def eval_var1(environment, expr, value):
+        return value, Derivation(environment, expr, value, 'E-Var1')
 
     @staticmethod
-    def eval_expr(environment, expr):
-        program = f'{strip_surrounding_parentheses(environment)} |- {strip_surrounding_parentheses(expr)}'
-        lex = Lexer(strip_surrounding_parentheses(expr))
-        comp = Compiler(program)
-        par = Parser(lex, comp)
-        return par.program()
+    def eval_var2(environment, expr, value, derivation_1):
+        return value, Derivation(environment, expr, value, 'E-Var2', (derivation_1,))
+
+    def eval_plus(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.left)
+        value_2, derivation_2 = self.eval_node(environment, expr.right)
+        value = value_1 + value_2
+        return value, Derivation(environment, expr, value, 'E-Plus', (
+            derivation_1,
+            derivation_2,
+            Arithmetic(value_1, 'plus', value_2, value, 'B-Plus'),
+        ))
+
+    def eval_minus(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.left)
+        value_2, derivation_2 = self.eval_node(environment, expr.right)
+        value = value_1 - value_2
+        return value, Derivation(environment, expr, value, 'E-Minus', (
+            derivation_1,
+            derivation_2,
+            Arithmetic(value_1, 'minus', value_2, value, 'B-Minus'),
+        ))
+
+    def eval_times(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.left)
+        value_2, derivation_2 = self.eval_node(environment, expr.right)
+        value = value_1 * value_2
+        return value, Derivation(environment, expr, value, 'E-Times', (
+            derivation_1,
+            derivation_2,
+            Arithmetic(value_1, 'times', value_2, value, 'B-Times'),
+        ))
+
+    def eval_lt(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.left)
+        value_2, derivation_2 = self.eval_node(environment, expr.right)
+        value = value_1 < value_2
+        return value, Derivation(environment, expr, value, 'E-Lt', (
+            derivation_1,
+            derivation_2,
+            Arithmetic(value_1, 'less than', value_2, value, 'B-Lt'),
+        ))
+
+    def eval_let(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.bound)
+        new_env = environment.extend(expr.name, value_1)
+
+        value_2, derivation_2 = self.eval_node(new_env, expr.body)
+        return value_2, Derivation(environment, expr, value_2, 'E-Let', (derivation_1, derivation_2))
+
+    def eval_if(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.cond)
+        if value_1 is True:
+            value, derivation_2 = self.eval_node(environment, expr.then)
+            return value, Derivation(environment, expr, value, 'E-IfT', (derivation_1, derivation_2))
+        else:
+            value, derivation_3 = self.eval_node(environment, expr.orelse)
+            return value, Derivation(environment, expr, value, 'E-IfF', (derivation_1, derivation_3))
 
+    @staticmethod
+    def eval_fun(environment, expr):
+        value = Closure(environment, expr.param, expr.body)
+        return value, Derivation(environment, expr, value, 'E-Fun')
+
+    # Evaluate the function position once, then pick E-App or E-AppRec from the kind of closure it gave.
+    def eval_app_base(self, environment, expr):
+        value_1, derivation_1 = self.eval_node(environment, expr.fun)
+        if type(value_1) is RecClosure:
+            return self.eval_app_rec(environment, expr, value_1, derivation_1)
+        elif type(value_1) is Closure:
+            return self.eval_app(environment, expr, value_1, derivation_1)
+        raise TypeError(f'{expr.fun} evaluates to {format_value(value_1)}, which is not a function')
+
+    def eval_app(self, environment, expr, value_1, derivation_1):
+        value_2, derivation_2 = self.eval_node(environment, expr.arg)
+        new_env = value_1.environment.extend(value_1.param, value_2)
+        value, derivation_3 = self.eval_cached(new_env, value_1.body)
+        return value, Derivation(environment, expr, value, 'E-App', (derivation_1, derivation_2, derivation_3))
+
+    def eval_let_rec(self, environment, expr):
+        closure = RecClosure(environment, expr.name, expr.param, expr.fun_body)
+        new_env = environment.extend(expr.name, closure)
+        value, derivation_1 = self.eval_node(new_env, expr.body)
+        return value, Derivation(environment, expr, value, 'E-LetRec', (derivation_1,))
+
+    def eval_app_rec(self, environment, expr, value_1, derivation_1):
+        value_2, derivation_2 = self.eval_node(environment, expr.arg)
+        new_env = value_1.environment.extend(value_1.name, value_1).extend(value_1.param, value_2)
+        value, derivation_3 = self.eval_cached(new_env, value_1.body)
+        return value, Derivation(environment, expr, value, 'E-AppRec', (derivation_1, derivation_2, derivation_3))
 
-v, e = Compiler.eval_expr('', 'let twice = fun f -> fun x -> f (f x) in twice (fun x -> x * x) 2')
+    @staticmethod
+    def eval_expr(environment, expr, mode=EvalMode.DERIVATION, cache=None):
+        program = f'{environment} |- {expr}'
+        comp = Compiler(program, mode, cache)
+        return comp.evaluate()
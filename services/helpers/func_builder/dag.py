@@ -0,0 +1,189 @@
+import io
+
+from services.helpers.func_builder.derivation import Derivation, format_judgment, write_derivation
+from services.helpers.func_builder.values import format_environment
+
+# Binary derivation format, all integers unsigned LEB128 varints:
+#   magic            b'FBD\x01'
+#   string count     then each string as its UTF-8 length followed by the bytes
+#   judgment count   then each judgment as conclusion string index, rule string index,
+#                    premise count and the indexes of its premises
+# Judgments are written premises first, so every premise index refers back to an earlier judgment,
+# and the last judgment is the root. A judgment used as a premise several times is stored once.
+MAGIC = b'FBD\x01'
+
+
+# Judgment is a node of a derivation DAG. It has the same conclusion(), rule and premises as a Derivation,
+# so write_derivation expands a DAG back into the full text; premises may be shared with other judgments.
+class Judgment:
+    __slots__ = ('text', 'rule', 'premises', 'index')
+
+    def __init__(self, text, rule, premises, index):
+        self.text = text
+        self.rule = rule
+        self.premises = premises
+        self.index = index
+
+    def conclusion(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+
+# DerivationDag interns judgments: identical conclusions derived by the same rule from the same premises
+# become one Judgment, so the repeated subderivations of recursive calls are formatted and stored once.
+class DerivationDag:
+    def __init__(self):
+        self.judgments = []  # Premises before the judgments that use them.
+        self.table = {}  # (text, rule, premise indexes) -> Judgment
+        self.environments = {}  # id(environment) -> (environment, text); the environment is kept so ids stay unique.
+
+    def judgment(self, text, rule, premises):
+        key = (text, rule, tuple(premise.index for premise in premises))
+        judgment = self.table.get(key)
+        if judgment is None:
+            judgment = Judgment(text, rule, premises, len(self.judgments))
+            self.judgments.append(judgment)
+            self.table[key] = judgment
+        return judgment
+
+    # Most judgments of a derivation share their environment object with a neighbour, so each is formatted once.
+    def conclusion(self, derivation):
+        if type(derivation) is not Derivation:
+            return derivation.conclusion()
+        entry = self.environments.get(id(derivation.environment))
+        if entry is None:
+            entry = (derivation.environment, format_environment(derivation.environment))
+            self.environments[id(derivation.environment)] = entry
+        return format_judgment(entry[1], derivation.expr, derivation.value)
+
+    # Add a derivation tree to the DAG and return the Judgment for its root.
+    # The tree is walked with an explicit stack, premises first, so deep derivations do not hit the recursion limit.
+    def intern(self, derivation):
+        interned = {}  # id(derivation) -> Judgment, for derivation objects that occur more than once.
+        stack = [(derivation, False)]
+        while stack:
+            node, ready = stack.pop()
+            if id(node) in interned:
+                continue
+            if ready:
+                premises = tuple(interned[id(premise)] for premise in node.premises)
+                interned[id(node)] = self.judgment(self.conclusion(node), node.rule, premises)
+            else:
+                stack.append((node, True))
+                stack.extend((premise, False) for premise in reversed(node.premises))
+        return interned[id(derivation)]
+
+    @property
+    def root(self):
+        return self.judgments[-1]
+
+    def __len__(self):
+        return len(self.judgments)
+
+
+def share_derivation(derivation):
+    dag = DerivationDag()
+    dag.intern(derivation)
+    return dag
+
+
+def write_varint(buffer, number):
+    while number >= 0x80:
+        buffer.append(number & 0x7f | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def read_varint(data, offset):
+    number = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+# Serialize the DAG holding root, keeping only the judgments root is derived from.
+def dump_dag(root):
+    judgments = []
+    indexes = {}  # id(Judgment) -> position in judgments
+    stack = [(root, False)]
+    while stack:
+        judgment, ready = stack.pop()
+        if id(judgment) in indexes:
+            continue
+        if ready:
+            indexes[id(judgment)] = len(judgments)
+            judgments.append(judgment)
+        else:
+            stack.append((judgment, True))
+            stack.extend((premise, False) for premise in reversed(judgment.premises))
+
+    strings = {}
+    for judgment in judgments:
+        strings.setdefault(judgment.text, len(strings))
+        strings.setdefault(judgment.rule, len(strings))
+
+    buffer = bytearray(MAGIC)
+    write_varint(buffer, len(strings))
+    for string in strings:
+        encoded = string.encode('utf-8')
+        write_varint(buffer, len(encoded))
+        buffer += encoded
+
+    write_varint(buffer, len(judgments))
+    for judgment in judgments:
+        write_varint(buffer, strings[judgment.text])
+        write_varint(buffer, strings[judgment.rule])
+        write_varint(buffer, len(judgment.premises))
+        for premise in judgment.premises:
+            write_varint(buffer, indexes[id(premise)])
+    return bytes(buffer)
+
+
+def dump_derivation(derivation):
+    return dump_dag(share_derivation(derivation).root)
+
+
+def load_dag(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a serialized derivation')
+    data = memoryview(data)
+    offset = len(MAGIC)
+
+    count, offset = read_varint(data, offset)
+    strings = []
+    for _ in range(count):
+        size, offset = read_varint(data, offset)
+        strings.append(str(data[offset:offset + size], 'utf-8'))
+        offset += size
+
+    dag = DerivationDag()
+    judgments = []
+    count, offset = read_varint(data, offset)
+    for _ in range(count):
+        text, offset = read_varint(data, offset)
+        rule, offset = read_varint(data, offset)
+        size, offset = read_varint(data, offset)
+        premises = []
+        for _ in range(size):
+            premise, offset = read_varint(data, offset)
+            premises.append(judgments[premise])
+        judgments.append(dag.judgment(strings[text], strings[rule], tuple(premises)))
+    return dag
+
+
+# Expand a serialized derivation back into the text written by write_derivation.
+def write_expanded(data, stream, indent='    '):
+    write_derivation(load_dag(data).root, stream, indent)
+
+
+def expand_derivation(data, indent='    '):
+    stream = io.StringIO()
+    write_expanded(data, stream, indent)
+    return stream.getvalue()
@@ -0,0 +1,80 @@
+import io
+
+from services.helpers.func_builder.values import format_environment, format_value
+
+
+# Derivation is one evalto judgment together with the premises it was derived from.
+# Environments, expressions and values are kept as they are and only formatted when written.
+class Derivation:
+    __slots__ = ('environment', 'expr', 'value', 'rule', 'premises')
+
+    def __init__(self, environment, expr, value, rule, premises=()):
+        self.environment = environment
+        self.expr = expr
+        self.value = value
+        self.rule = rule
+        self.premises = premises
+
+    def conclusion(self):
+        return format_judgment(format_environment(self.environment), self.expr, self.value)
+
+    def __str__(self):
+        return render_derivation(self)
+
+
+# Return the text of an evalto judgment whose environment has already been formatted.
+def format_judgment(environment, expr, value):
+    if environment == '':
+        return f'|- {expr} evalto {format_value(value)}'
+    return f'{environment} |- {expr} evalto {format_value(value)}'
+
+
+# Arithmetic is a B-Plus, B-Minus, B-Times or B-Lt judgment; it never has premises.
+class Arithmetic:
+    __slots__ = ('value_1', 'verb', 'value_2', 'value', 'rule')
+
+    premises = ()
+
+    def __init__(self, value_1, verb, value_2, value, rule):
+        self.value_1 = value_1
+        self.verb = verb
+        self.value_2 = value_2
+        self.value = value
+        self.rule = rule
+
+    def conclusion(self):
+        return f'{format_value(self.value_1)} {self.verb} {format_value(self.value_2)} is {format_value(self.value)}'
+
+    def __str__(self):
+        return render_derivation(self)
+
+
+# Write a derivation to a text stream one line at a time, indenting premises under their conclusion.
+# The tree is walked with an explicit stack, so deep derivations never hold their whole text in memory.
+def write_derivation(derivation, stream, indent='    '):
+    stack = [(derivation, 0)]
+    while stack:
+        judgment, depth = stack.pop()
+        prefix = indent * depth
+
+        if judgment is None:
+            # Closing brace of a judgment whose premises have all been written.
+            stream.write(f'{prefix}}};\n')
+        elif judgment.premises:
+            stream.write(f'{prefix}{judgment.conclusion()} by {judgment.rule} {{\n')
+            stack.append((None, depth))
+            stack.extend((premise, depth + 1) for premise in reversed(judgment.premises))
+        else:
+            stream.write(f'{prefix}{judgment.conclusion()} by {judgment.rule} {{}};\n')
+
+
+# Write a derivation to a connected socket through a buffered text wrapper.
+def send_derivation(derivation, sock, indent='    ', encoding='utf-8'):
+    with sock.makefile('w', encoding=encoding) as stream:
+        write_derivation(derivation, stream, indent)
+
+
+def render_derivation(derivation, indent='    '):
+    stream = io.StringIO()
+    write_derivation(derivation, stream, indent)
+    return stream.getvalue()
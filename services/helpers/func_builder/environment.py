@@ -0,0 +1,57 @@
+import itertools
+
+
+# Environment is an immutable sequence of (ident, value) bindings, innermost binding last.
+# It is a view of the first `size` entries of a list shared with the scopes it was extended from:
+# extending the newest scope appends in place, and only extending an older scope copies its prefix.
+# Entries are never overwritten, so every view stays valid while others grow the list.
+class Environment:
+    __slots__ = ('bindings', 'size', 'key')
+
+    def __init__(self, bindings=None, size=0):
+        self.bindings = [] if bindings is None else bindings
+        self.size = size
+        self.key = None  # Canonical key, filled in by memo.environment_key.
+
+    @staticmethod
+    def of(bindings):
+        bindings = list(bindings)
+        return Environment(bindings, len(bindings))
+
+    def extend(self, ident, value):
+        binding = (ident, value)
+        bindings = self.bindings
+        size = self.size
+        if len(bindings) == size:
+            bindings.append(binding)
+            # Another scope may have claimed this slot between the check and the append.
+            if bindings[size] is binding:
+                return Environment(bindings, size + 1)
+        bindings = bindings[:size]
+        bindings.append(binding)
+        return Environment(bindings, size + 1)
+
+    # Return the value bound `index` bindings out from the innermost one (a de Bruijn index).
+    def lookup(self, index):
+        return self.bindings[self.size - 1 - index][1]
+
+    # Return the de Bruijn index of the innermost binding of ident.
+    def index(self, ident):
+        bindings = self.bindings
+        for i in range(self.size - 1, -1, -1):
+            if bindings[i][0] == ident:
+                return self.size - 1 - i
+        raise NameError(f'Unbound variable: {ident}')
+
+    # Return this environment without its `count` innermost bindings.
+    def drop(self, count=1):
+        return Environment(self.bindings, self.size - count)
+
+    def names(self):
+        return tuple(ident for ident, _ in self)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return itertools.islice(self.bindings, self.size)
@@ -1,28 +1,16 @@
+import re
 import sys
 import enum
+from array import array
 
 
-# Lexer object keeps track of current position in the source code and produces each token.
+# Lexer produces each token of the source code in turn.
+# The whole source is tokenized in one pass up front, and get_token hands the tokens out one at a time.
 class Lexer:
     def __init__(self, source):
         self.source = source
-        self.cur_char = ''  # Current character in the string.
-        self.cur_pos = -1  # Current position in the string.
-        self.next_char()
-
-    # Process the next character.
-    def next_char(self):
-        self.cur_pos += 1
-        if self.cur_pos >= len(self.source):
-            self.cur_char = '\0'  # EOF
-        else:
-            self.cur_char = self.source[self.cur_pos]
-
-    # Return the lookahead character.
-    def peek(self):
-        if self.cur_pos + 1 >= len(self.source):
-            return '\0'
-        return self.source[self.cur_pos + 1]
+        self.tokens = tokenize(source)
+        self.cur_pos = 0  # Index of the next token to hand out.
 
     # Invalid token found, print error message and exit.
     @staticmethod
@@ -31,87 +19,80 @@ class Lexer:
 
     # Return the next token.
     def get_token(self):
-        self.skip_whitespace()
-        token = None
-
-        if self.cur_char == '+':
-            token = Token(self.cur_char, TokenType.PLUS)
-        elif self.cur_char == '-':
-            if self.peek() == '>':
-                last_char = self.cur_char
-                self.next_char()
-                token = Token(last_char + self.cur_char, TokenType.ARROW)
+        token = self.tokens.token(self.cur_pos)
+        if self.cur_pos < len(self.tokens) - 1:  # Keep returning EOF once the end is reached.
+            self.cur_pos += 1
+        return token
+
+
+# TokenStream is the compact result of tokenize: parallel arrays of token kinds and source offsets, ending in EOF.
+class TokenStream:
+    __slots__ = ('source', 'kinds', 'starts', 'ends')
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('h')  # TokenType values.
+        self.starts = array('l')
+        self.ends = array('l')
+
+    def append(self, kind, start, end):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def kind(self, i):
+        return TOKEN_TYPES[self.kinds[i]]
+
+    def text(self, i):
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def token(self, i):
+        return Token(self.text(i), TOKEN_TYPES[self.kinds[i]])
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+# Tokenize the whole source with one precompiled pattern.
+def tokenize(source):
+    tokens = TokenStream(source)
+    for match in TOKEN_PATTERN.finditer(source):
+        group = match.lastgroup
+        if group == 'space':
+            continue
+
+        start, end = match.span()
+        if group == 'word':
+            text = match.group()
+            if text == 'true' or text == 'false':
+                kind = TokenType.BOOL
             else:
-                token = Token(self.cur_char, TokenType.MINUS)
-        elif self.cur_char == '*':
-            token = Token(self.cur_char, TokenType.ASTERISK)
-        elif self.cur_char == '=':
-            # Check whether this token is =
-            token = Token(self.cur_char, TokenType.EQ)
-        elif self.cur_char == '<':
-            # Check whether this is token is <
-            token = Token(self.cur_char, TokenType.LT)
-        elif self.cur_char == '(':
-            # Check whether this is token is (
-            token = Token(self.cur_char, TokenType.OPEN_PAREN)
-        elif self.cur_char == ')':
-            # Check whether this is token is )
-            token = Token(self.cur_char, TokenType.CLOSE_PAREN)
-        elif self.cur_char.isdigit():
-            # Leading character is a digit, so this must be a number.
-            # Get all consecutive digits.
-            start_pos = self.cur_pos
-            while self.peek().isdigit():
-                self.next_char()
-
-            token_txt = self.source[start_pos: self.cur_pos + 1]  # Get the substring.
-            token = Token(token_txt, TokenType.NUMBER)
-        elif self.cur_char.isalpha():
-            # Leading character is a letter, so this must be an identifier or a keyword.
-            # Get all consecutive alphanumeric characters.
-            start_pos = self.cur_pos
-            while self.peek().isalnum():
-                self.next_char()
-
-            # Check if the token is in the list of keywords.
-            token_txt = self.source[start_pos: self.cur_pos + 1]  # Get the substring.
-            keyword = Token.check_if_keyword(token_txt)
-
-            if token_txt == 'true' or token_txt == 'false':
-                token = Token(token_txt, TokenType.BOOL)  # Bool
-            elif keyword is None:  # Identifier
-                token = Token(token_txt, TokenType.IDENT)
-            else:  # Keyword
-                token = Token(token_txt, keyword)
-        elif self.cur_char == '\0':
-            # EOF.
-            token = Token('', TokenType.EOF)
+                kind = KEYWORDS.get(text.upper(), TokenType.IDENT)
+        elif group == 'number':
+            kind = TokenType.NUMBER
+        elif group == 'symbol':
+            kind = SYMBOLS[match.group()]
         else:
             # Unknown token!
-            self.abort("Unknown token: " + self.cur_char)
+            Lexer.abort("Unknown token: " + match.group())
 
-        self.next_char()
-        return token
+        tokens.append(kind.value, start, end)
 
-    # Skip whitespace except newlines, which we will use to indicate the end of a statement.
-    def skip_whitespace(self):
-        while self.cur_char == ' ' or self.cur_char == '\t' or self.cur_char == '\r':
-            self.next_char()
+    tokens.append(TokenType.EOF.value, len(source), len(source))
+    return tokens
 
 
 # Token contains the original text and the type of token.
 class Token:
+    __slots__ = ('text', 'kind')
+
     def __init__(self, token_txt, token_type):
         self.text = token_txt  # The token's actual text. Used for identifiers, strings, and numbers.
         self.kind = token_type  # The TokenType that this token is classified as.
 
     @staticmethod
     def check_if_keyword(token_txt):
-        for kind in TokenType:
-            # Relies on all keyword enum values being 1XX.
-            if kind.name == token_txt.upper() and 100 <= kind.value < 200:
-                return kind
-        return None
+        return KEYWORDS.get(token_txt.upper())
 
 
 # TokenType is our enum for all the types of tokens.
@@ -136,6 +117,38 @@ class TokenType(enum.Enum):
     MINUS = 203
     ASTERISK = 204
     LT = 208
+    COMMA = 209
     # Parenthesis
     OPEN_PAREN = 301
     CLOSE_PAREN = 302
+    OPEN_BRACKET = 303
+    CLOSE_BRACKET = 304
+
+
+# Relies on all keyword enum values being 1XX. ARROW is spelled '->', so it is matched as a symbol instead.
+KEYWORDS = {kind.name: kind for kind in TokenType if 100 <= kind.value < 200 and kind != TokenType.ARROW}
+
+SYMBOLS = {
+    '->': TokenType.ARROW,
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.ASTERISK,
+    '=': TokenType.EQ,
+    '<': TokenType.LT,
+    ',': TokenType.COMMA,
+    '(': TokenType.OPEN_PAREN,
+    ')': TokenType.CLOSE_PAREN,
+    '[': TokenType.OPEN_BRACKET,
+    ']': TokenType.CLOSE_BRACKET,
+}
+
+TOKEN_TYPES = {kind.value: kind for kind in TokenType}
+
+# Words start with a letter and continue with letters or digits; '->' is tried before '-'.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>[ \t\r\n]+)
+  | (?P<number>[0-9]+)
+  | (?P<word>[^\W\d_][^\W_]*)
+  | (?P<symbol>->|[-+*=<,()\[\]])
+  | (?P<unknown>.)
+""", re.VERBOSE | re.DOTALL)
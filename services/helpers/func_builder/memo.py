@@ -0,0 +1,128 @@
+import collections
+import sys
+import threading
+
+from services.helpers.func_builder.values import Closure, RecClosure
+
+
+# Return a hashable key that is equal for environments with the same names bound to the same values.
+# Syntax trees are shared by source text (see Compiler.parse), so closure bodies are compared by identity.
+# The key is kept on the environment, which never changes once built.
+def environment_key(environment):
+    key = environment.key
+    if key is None:
+        key = environment.key = tuple((ident, value_key(value)) for ident, value in environment)
+    return key
+
+
+def value_key(value):
+    kind = type(value)
+    if kind is bool:
+        # True == 1 in Python, but not in the language.
+        return bool, value
+    elif kind is Closure:
+        return Closure, environment_key(value.environment), value.param, value.body
+    elif kind is RecClosure:
+        return RecClosure, environment_key(value.environment), value.name, value.param, value.body
+    return value
+
+
+# Bytes a cached judgment keeps alive: the Derivation, its premises tuple and its share of the environments,
+# as measured with tracemalloc on recursive programs.
+JUDGMENT_BYTES = 160
+
+# Bytes of one binding in an environment key: the (name, value key) pair and its slot in the key tuple.
+BINDING_BYTES = 72
+
+
+# JudgmentCache remembers what an expression evaluated to in an environment, for the Compiler to reuse.
+# Entries are evicted least recently used first once there are more than max_entries of them, or once their
+# estimated size passes max_bytes. With derivations set, derivation mode also stores and reuses the Derivation;
+# otherwise only values are kept and derivation mode evaluates as usual.
+# A derivation reused this way is shared between the derivations that contain it, so an entry's size counts
+# only the judgments not already held by another entry, plus its environment key. Sizes are estimates from
+# JUDGMENT_BYTES and BINDING_BYTES; a derivation still reachable from a kept entry is not freed when its own entry
+# is evicted. The cache may be shared between threads.
+class JudgmentCache:
+    def __init__(self, max_entries=4096, max_bytes=None, derivations=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.derivations = derivations
+
+        self.entries = collections.OrderedDict()  # (node, environment key) -> (value, derivation or None, size)
+        self.stored = set()  # ids of the derivations in entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(environment, node):
+        return node, environment_key(environment)
+
+    # Return (value, derivation) for key, or None. The derivation is None if it was not stored,
+    # and an entry without one does not count when a derivation is required.
+    def get(self, key, derivation=False):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or (derivation and entry[1] is None):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, value, derivation=None):
+        if not self.derivations:
+            derivation = None
+        size = sys.getsizeof(key) + BINDING_BYTES * len(key[1]) + sys.getsizeof(value)
+
+        with self._lock:
+            if derivation is not None:
+                size += JUDGMENT_BYTES * self.new_judgments(derivation)
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+                self.stored.discard(id(previous[1]))
+            self.entries[key] = (value, derivation, size)
+            self.stored.add(id(derivation))
+            self.size += size
+
+            while self.entries and (len(self.entries) > self.max_entries
+                                    or (self.max_bytes is not None and self.size > self.max_bytes)):
+                _, (_, evicted, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stored.discard(id(evicted))
+                self.evictions += 1
+
+    # Count the judgments of derivation, stopping at premises that other entries hold already.
+    def new_judgments(self, derivation):
+        count = 0
+        stack = [derivation]
+        while stack:
+            judgment = stack.pop()
+            count += 1
+            stack.extend(premise for premise in judgment.premises if id(premise) not in self.stored)
+        return count
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.stored.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,153 @@
+import functools
+
+from services.helpers.func_builder.nodes import *
+from services.helpers.func_builder.values import Closure, RecClosure
+
+
+# CodeGenerator translates a syntax tree into the source of a Python function, following the Compiler's rules:
+# ints and bools are Python ints and bools, closures become nested functions and if tests `is True`.
+# Every binder gets its own Python name, so shadowing and captured variables behave as in the interpreter.
+class CodeGenerator:
+    def __init__(self):
+        self.lines = []
+        self.counter = 0
+
+    def fresh(self, name):
+        self.counter += 1
+        return f'{name}_{self.counter}'
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    @staticmethod
+    def lookup(scope, node):
+        if node.index is not None:
+            return scope[len(scope) - 1 - node.index][1]
+        for name, py_name in reversed(scope):
+            if name == node.name:
+                return py_name
+        raise NameError(f'Unbound variable: {node.name}')
+
+    # Emit statements that return the value of node.
+    def statement(self, node, scope, indent):
+        kind = type(node)
+        if kind is Let:
+            py_name = self.fresh(node.name)
+            self.emit(indent, f'{py_name} = {self.expression(node.bound, scope, indent)}')
+            self.statement(node.body, scope + [(node.name, py_name)], indent)
+        elif kind is LetRec:
+            py_name = self.function(node.name, node.param, node.fun_body, scope, indent)
+            self.statement(node.body, scope + [(node.name, py_name)], indent)
+        elif kind is If:
+            # The then branch returns, so the else branch follows at the same level instead of nesting.
+            self.emit(indent, f'if {self.test(node.cond, scope, indent)}:')
+            self.statement(node.then, scope, indent + 1)
+            self.statement(node.orelse, scope, indent)
+        else:
+            self.emit(indent, f'return {self.expression(node, scope, indent)}')
+
+    # Return a Python expression for node, emitting any statements it needs at indent first.
+    # The language has no side effects, so hoisting a let or fun out of an expression does not change its value.
+    def expression(self, node, scope, indent):
+        kind = type(node)
+        if kind is Int:
+            return f'({node.value})' if node.value < 0 else str(node.value)
+        elif kind is Bool:
+            return 'True' if node.value else 'False'
+        elif kind is Var:
+            return self.lookup(scope, node)
+        elif kind is BinOp:
+            prec = OP_PRECEDENCE[node.op]
+            left = self.operand(node.left, prec, scope, indent)
+            right = self.operand(node.right, prec + 1, scope, indent)
+            return f'{left} {OP_SYMBOL[node.op]} {right}'
+        elif kind is App:
+            return f'{self.operand(node.fun, 4, scope, indent)}({self.expression(node.arg, scope, indent)})'
+        elif kind is If:
+            return self.conditional(node, scope, indent)
+        elif kind is Let:
+            py_name = self.fresh(node.name)
+            self.emit(indent, f'{py_name} = {self.expression(node.bound, scope, indent)}')
+            return self.expression(node.body, scope + [(node.name, py_name)], indent)
+        elif kind is LetRec:
+            py_name = self.function(node.name, node.param, node.fun_body, scope, indent)
+            return self.expression(node.body, scope + [(node.name, py_name)], indent)
+        elif kind is Fun:
+            return self.function(None, node.param, node.body, scope, indent)
+        raise TypeError(f'Unknown node: {node!r}')
+
+    # Parenthesize binary operations that bind looser than their position; '<' never chains as it does in Python.
+    # A let or let rec is hoisted into statements and leaves the expression of its body, which is what is checked.
+    def operand(self, node, prec, scope, indent):
+        text = self.expression(node, scope, indent)
+        while type(node) is Let or type(node) is LetRec:
+            node = node.body
+        if type(node) is BinOp and (OP_PRECEDENCE[node.op] < prec or node.op == OpType.LT):
+            return f'({text})'
+        return text
+
+    # Return the test for an if condition. Only true selects the then branch, which is known up front for literals.
+    def test(self, node, scope, indent):
+        if type(node) is Bool:
+            return 'True' if node.value else 'False'
+        elif type(node) is Int:
+            return 'False'
+        return f'({self.expression(node, scope, indent)}) is True'
+
+    def conditional(self, node, scope, indent):
+        cond = self.test(node.cond, scope, indent)
+
+        # Generate each branch on its own so that only the chosen one is evaluated.
+        lines = self.lines
+        self.lines = then_lines = []
+        then = self.expression(node.then, scope, indent + 1)
+        self.lines = orelse_lines = []
+        orelse = self.expression(node.orelse, scope, indent + 1)
+        self.lines = lines
+
+        if not then_lines and not orelse_lines:
+            return f'({then} if {cond} else {orelse})'
+
+        py_name = self.fresh('if')
+        self.emit(indent, f'if {cond}:')
+        self.lines.extend(then_lines)
+        self.emit(indent + 1, f'{py_name} = {then}')
+        self.emit(indent, 'else:')
+        self.lines.extend(orelse_lines)
+        self.emit(indent + 1, f'{py_name} = {orelse}')
+        return py_name
+
+    # Emit a def for a fun, or for a let rec when name is given, and return its Python name.
+    def function(self, name, param, body, scope, indent):
+        py_name = self.fresh(name or 'fun')
+        py_param = self.fresh(param)
+        inner = scope + [(name, py_name)] if name is not None else scope
+        self.emit(indent, f'def {py_name}({py_param}):')
+        self.statement(body, inner + [(param, py_param)], indent + 1)
+        return py_name
+
+
+# Compile node, evaluated in an environment binding names, into a Python function taking those names' values.
+@functools.lru_cache(maxsize=256)
+def generate(node, names):
+    generator = CodeGenerator()
+    scope = [(name, generator.fresh(name)) for name in names]
+    generator.emit(0, f'def program({", ".join(py_name for _, py_name in scope)}):')
+    generator.statement(node, scope, 1)
+
+    namespace = {}
+    exec(compile('\n'.join(generator.lines), '<func_builder>', 'exec'), namespace)
+    return namespace['program']
+
+
+# Evaluate node natively in environment. Functions in the result are plain Python callables.
+def compile_native(node, environment):
+    return generate(node, environment.names())(*(native_value(value) for _, value in environment))
+
+
+def native_value(value):
+    if type(value) is Closure:
+        return compile_native(Fun(value.param, value.body), value.environment)
+    elif type(value) is RecClosure:
+        return compile_native(LetRec(value.name, value.param, value.body, Var(value.name, 0)), value.environment)
+    return value
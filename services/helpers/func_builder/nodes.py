@@ -0,0 +1,159 @@
+import enum
+
+
+# Node is the base of the abstract syntax tree produced by the Parser.
+# Every node prints back as source text, adding parentheses only where the grammar needs them.
+class Node:
+    __slots__ = ()
+
+    # Binding strength used when printing; let, if and fun extend as far right as possible.
+    precedence = 0
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self})'
+
+    # Return the source text of this node as an operand of something binding at least as tight as prec.
+    def operand(self, prec):
+        if self.precedence < prec:
+            return f'({self})'
+        return str(self)
+
+
+class Int(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    # A negative literal reads as a subtraction when it is applied to or applied as an argument.
+    @property
+    def precedence(self):
+        return 5 if self.value >= 0 else 3
+
+    def __str__(self):
+        return str(self.value)
+
+
+class Bool(Node):
+    __slots__ = ('value',)
+    precedence = 5
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return 'true' if self.value else 'false'
+
+
+# Var carries the de Bruijn index of its binding when the Parser could resolve it, and None otherwise.
+class Var(Node):
+    __slots__ = ('name', 'index')
+    precedence = 5
+
+    def __init__(self, name, index=None):
+        self.name = name
+        self.index = index
+
+    def __str__(self):
+        return self.name
+
+
+class BinOp(Node):
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    @property
+    def precedence(self):
+        return OP_PRECEDENCE[self.op]
+
+    def __str__(self):
+        prec = OP_PRECEDENCE[self.op]
+        # Operators are left associative, so only the right operand needs parentheses at equal strength.
+        return f'{self.left.operand(prec)} {OP_SYMBOL[self.op]} {self.right.operand(prec + 1)}'
+
+
+class If(Node):
+    __slots__ = ('cond', 'then', 'orelse')
+
+    def __init__(self, cond, then, orelse):
+        self.cond = cond
+        self.then = then
+        self.orelse = orelse
+
+    def __str__(self):
+        return f'if {self.cond} then {self.then} else {self.orelse}'
+
+
+class Let(Node):
+    __slots__ = ('name', 'bound', 'body')
+
+    def __init__(self, name, bound, body):
+        self.name = name
+        self.bound = bound
+        self.body = body
+
+    def __str__(self):
+        return f'let {self.name} = {self.bound} in {self.body}'
+
+
+class LetRec(Node):
+    __slots__ = ('name', 'param', 'fun_body', 'body')
+
+    def __init__(self, name, param, fun_body, body):
+        self.name = name
+        self.param = param
+        self.fun_body = fun_body
+        self.body = body
+
+    def __str__(self):
+        return f'let rec {self.name} = fun {self.param} -> {self.fun_body} in {self.body}'
+
+
+class Fun(Node):
+    __slots__ = ('param', 'body')
+
+    def __init__(self, param, body):
+        self.param = param
+        self.body = body
+
+    def __str__(self):
+        return f'fun {self.param} -> {self.body}'
+
+
+class App(Node):
+    __slots__ = ('fun', 'arg')
+    precedence = 4
+
+    def __init__(self, fun, arg):
+        self.fun = fun
+        self.arg = arg
+
+    def __str__(self):
+        return f'{self.fun.operand(4)} {self.arg.operand(5)}'
+
+
+# OpType is our enum for the binary operators of the language.
+class OpType(enum.Enum):
+    PLUS = 1
+    MINUS = 2
+    ASTERISK = 3
+    LT = 4
+
+
+OP_SYMBOL = {
+    OpType.PLUS: '+',
+    OpType.MINUS: '-',
+    OpType.ASTERISK: '*',
+    OpType.LT: '<',
+}
+
+OP_PRECEDENCE = {
+    OpType.LT: 1,
+    OpType.PLUS: 2,
+    OpType.MINUS: 2,
+    OpType.ASTERISK: 3,
+}
@@ -0,0 +1,80 @@
+import functools
+
+from services.helpers.func_builder.nodes import *
+
+
+# Return a tree that evaluates to the same value as node, with work that does not depend on the environment done:
+# arithmetic on literals is folded, lets bound to literals are inlined, ifs on literals keep only the branch taken
+# and an immediately applied fun becomes a let. Operations the evaluator would reject, such as true + 1, are left.
+# The judgments of the result differ from the original's, so derivation mode evaluates the original tree.
+@functools.lru_cache(maxsize=256)
+def optimize(node):
+    return fold(node, [])
+
+
+# Fold node whose binders are described by scope, innermost last: the literal a binder was inlined with,
+# or None for a binder that is kept. Variables bound by kept binders are renumbered past the inlined ones.
+def fold(node, scope):
+    kind = type(node)
+    if kind is Var:
+        if node.index is None:
+            return node
+        elif node.index < len(scope):
+            literal = scope[len(scope) - 1 - node.index]
+            if literal is not None:
+                return literal
+        inlined = sum(1 for literal in scope[max(len(scope) - node.index, 0):] if literal is not None)
+        return Var(node.name, node.index - inlined) if inlined else node
+    elif kind is BinOp:
+        left = fold(node.left, scope)
+        right = fold(node.right, scope)
+        if type(left) is Int and type(right) is Int:
+            if node.op == OpType.PLUS:
+                return Int(left.value + right.value)
+            elif node.op == OpType.MINUS:
+                return Int(left.value - right.value)
+            elif node.op == OpType.ASTERISK:
+                return Int(left.value * right.value)
+            return Bool(left.value < right.value)
+        return BinOp(node.op, left, right)
+    elif kind is If:
+        cond = fold(node.cond, scope)
+        # Only true selects the then branch, as in the Compiler.
+        if type(cond) is Bool and cond.value is True:
+            return fold(node.then, scope)
+        elif type(cond) is Bool or type(cond) is Int:
+            return fold(node.orelse, scope)
+        return If(cond, fold(node.then, scope), fold(node.orelse, scope))
+    elif kind is Let:
+        return fold_let(node.name, fold(node.bound, scope), node.body, scope)
+    elif kind is App:
+        if type(node.fun) is Fun:
+            # (fun x -> e) a evaluates a, then e with x bound to it in the same environment: let x = a in e.
+            return fold_let(node.fun.param, fold(node.arg, scope), node.fun.body, scope)
+        fun = fold(node.fun, scope)
+        arg = fold(node.arg, scope)
+        if type(fun) is Fun:
+            # The fun only appeared by folding, so its body is already folded and only needs the argument inlined.
+            if type(arg) is Int or type(arg) is Bool:
+                return fold(fun.body, [arg])
+            return Let(fun.param, arg, fun.body)
+        return App(fun, arg)
+    elif kind is Fun:
+        return Fun(node.param, scoped(node.body, scope, (None,)))
+    elif kind is LetRec:
+        return LetRec(node.name, node.param, scoped(node.fun_body, scope, (None, None)),
+                      scoped(node.body, scope, (None,)))
+    return node
+
+
+def fold_let(name, bound, body, scope):
+    if type(bound) is Int or type(bound) is Bool:
+        return scoped(body, scope, (bound,))
+    return Let(name, bound, scoped(body, scope, (None,)))
+
+
+def scoped(node, scope, binders):
+    scope.extend(binders)
+    node = fold(node, scope)
+    del scope[len(scope) - len(binders):]
+    return node
@@ -1,14 +1,15 @@
+from services.helpers.func_builder.environment import Environment
 from services.helpers.func_builder.lexer import *
+from services.helpers.func_builder.nodes import *
+from services.helpers.func_builder.values import Closure, RecClosure
 
 
-# Parser object keeps track of current token, checks if the code matches the grammar, and emits code along the way.
+# Parser object keeps track of current token, checks if the code matches the grammar, and builds the syntax tree.
+# Variables are resolved to de Bruijn indexes against the names in scope, starting from the given ones.
 class Parser:
-    def __init__(self, lexer, compiler):
+    def __init__(self, lexer, scope=()):
         self.lexer = lexer
-        self.compiler = compiler
-
-        self.symbols = set()  # All variables we have declared so far.
-        self.labelsDeclared = set()  # Keep track of all labels declared
+        self.scope = list(scope)  # Names bound around the current token, innermost last.
 
         self.cur_token = None
         self.peekToken = None
@@ -27,6 +28,7 @@ class Parser:
     def match(self, kind):
         if not self.check_token(kind):
             self.abort("Expected " + kind.name + ", got " + self.cur_token.kind.name)
+        self.next_token()
 
     # Advances the current token.
     def next_token(self):
@@ -34,750 +36,204 @@ class Parser:
         self.peekToken = self.lexer.get_token()
         # No need to worry about passing the EOF, lexer handles that.
 
-    # Return true if the current token is a comparison operator.
-    def is_comparison_operator(self):
-        return self.check_token(TokenType.LT)
+    # Return true if the current token can start an argument of an application.
+    def is_primary(self):
+        return self.cur_token.kind in PRIMARY_TOKENS
 
     @staticmethod
     def abort(message):
         sys.exit("Error! " + message)
 
-    # program
+    # program ::= expression EOF
     def program(self):
+        node = self.expression()
+        self.match(TokenType.EOF)
+        return node
+
+    # environment ::= bindings EOF
+    def environment(self):
+        environment = self.bindings(TokenType.EOF)
+        self.match(TokenType.EOF)
+        return environment
+
+    # bindings ::= [ident "=" value {"," ident "=" value}]
+    def bindings(self, end):
+        bindings = []
+        while not self.check_token(end):
+            ident = self.ident()
+            self.match(TokenType.EQ)
+            bindings.append((ident, self.value()))
+            if not self.check_token(TokenType.COMMA):
+                break
+            self.next_token()
+        return Environment.of(bindings)
 
-        # Parse all the statements in the program.
-        while not self.check_token(TokenType.EOF):
-            return self.statement()
+    # value ::= number | "-" number | bool
+    #         | "(" bindings ")" "[" "FUN" ident "->" expression "]"
+    #         | "(" bindings ")" "[" "REC" ident "=" "FUN" ident "->" expression "]"
+    def value(self):
+        if self.check_token(TokenType.OPEN_PAREN):
+            self.next_token()
+            environment = self.bindings(TokenType.CLOSE_PAREN)
+            self.match(TokenType.CLOSE_PAREN)
+            self.match(TokenType.OPEN_BRACKET)
 
-    def statement(self):
-        # Check the first token to see what kind of statement this is.
+            # The body is resolved against the closure's own environment, not the surrounding one.
+            scope = self.scope
+            self.scope = list(environment.names())
 
-        # "IF" expression "THEN" expression "ELSE" expression
+            if self.check_token(TokenType.REC):
+                self.next_token()
+                name = self.ident()
+                self.match(TokenType.EQ)
+                self.match(TokenType.FUN)
+                param = self.ident()
+                self.match(TokenType.ARROW)
+                closure = RecClosure(environment, name, param, self.scoped((name, param)))
+            else:
+                self.match(TokenType.FUN)
+                param = self.ident()
+                self.match(TokenType.ARROW)
+                closure = Closure(environment, param, self.scoped((param,)))
+
+            self.scope = scope
+            self.match(TokenType.CLOSE_BRACKET)
+            return closure
+
+        elif self.check_token(TokenType.NUMBER) or self.check_token(TokenType.MINUS) \
+                or self.check_token(TokenType.BOOL):
+            return self.primary().value
+
+        self.abort("Invalid value at " + self.cur_token.text + " (" + self.cur_token.kind.name + ")")
+
+    # expression ::= "IF" expression "THEN" expression "ELSE" expression
+    #              | "LET" "REC" ident "=" "FUN" ident "->" expression "IN" expression
+    #              | "LET" ident "=" expression "IN" expression
+    #              | "FUN" ident "->" expression
+    #              | binary
+    def expression(self):
         if self.check_token(TokenType.IF):
             self.next_token()
-
-            expr_1 = ''
-            while not self.check_token(TokenType.THEN) and not self.check_token(TokenType.EOF):
-                expr_1 += f' {self.cur_token.text}'
-                self.next_token()
-
+            cond = self.expression()
             self.match(TokenType.THEN)
-            self.next_token()
-            expr_2 = ''
-            while not self.check_token(TokenType.ELSE) and not self.check_token(TokenType.EOF):
-                expr_2 += f' {self.cur_token.text}'
-                self.next_token()
-
+            then = self.expression()
             self.match(TokenType.ELSE)
-            self.next_token()
-            expr_3 = ''
-            while not self.check_token(TokenType.EOF):
-                expr_3 += f' {self.cur_token.text}'
-                self.next_token()
-
-            return self.compiler.eval_if(self.compiler.env, expr_1, expr_2, expr_3)
+            return If(cond, then, self.expression())
 
-        # "LET" ident = expression "IN" expression
         elif self.check_token(TokenType.LET):
             self.next_token()
 
             if self.check_token(TokenType.REC):
                 self.next_token()
-
-                self.match(TokenType.IDENT)
-                ident_1 = self.cur_token.text
-                self.next_token()
-
+                name = self.ident()
                 self.match(TokenType.EQ)
-                self.next_token()
-
-                self.match(TokenType.IDENT)
-                ident_2 = self.cur_token.text
-                self.next_token()
-
                 self.match(TokenType.FUN)
-                self.next_token()
-
-                expr_1 = ''
-                while not self.check_token(TokenType.IN) and not self.check_token(TokenType.EOF):
-                    expr_1 += f' {self.cur_token.text}'
-                    self.next_token()
-
-                self.match(TokenType.IN)
-                self.next_token()
-
-                expr_2 = ''
-                while not self.check_token(TokenType.EOF):
-                    expr_2 += f' {self.cur_token.text}'
-                    self.next_token()
-
-                return self.compiler.eval_let_rec(self.compiler.env, ident_1, ident_2, expr_1, expr_2)
-            else:
-                self.match(TokenType.IDENT)
-                ident = self.cur_token.text
-                self.next_token()
-
-                self.match(TokenType.EQ)
-                self.next_token()
-
-                expr_1 = ''
-                while not self.check_token(TokenType.IN) and not self.check_token(TokenType.EOF):
-                    expr_1 += f' {self.cur_token.text}'
-                    self.next_token()
-
+                param = self.ident()
+                self.match(TokenType.ARROW)
+                fun_body = self.scoped((name, param))
                 self.match(TokenType.IN)
-                self.next_token()
-
-                expr_2 = ''
-                while not self.check_token(TokenType.EOF):
-                    expr_2 += f' {self.cur_token.text}'
-                    self.next_token()
+                return LetRec(name, param, fun_body, self.scoped((name,)))
 
-                return self.compiler.eval_let(self.compiler.env, ident, expr_1, expr_2)
+            name = self.ident()
+            self.match(TokenType.EQ)
+            bound = self.expression()
+            self.match(TokenType.IN)
+            return Let(name, bound, self.scoped((name,)))
 
-        # "FUN" fun ident -> expression
         elif self.check_token(TokenType.FUN):
             self.next_token()
-
-            self.match(TokenType.IDENT)
-            ident = self.cur_token.text
-            self.next_token()
-
+            param = self.ident()
             self.match(TokenType.ARROW)
+            return Fun(param, self.scoped((param,)))
+
+        return self.binary()
+
+    # Parse an expression with names bound around it, innermost last.
+    def scoped(self, names):
+        self.scope.extend(names)
+        node = self.expression()
+        del self.scope[len(self.scope) - len(names):]
+        return node
+
+    # Return the de Bruijn index of ident in the current scope, or None if it is free.
+    def resolve(self, ident):
+        scope = self.scope
+        for i in range(len(scope) - 1, -1, -1):
+            if scope[i] == ident:
+                return len(scope) - 1 - i
+        return None
+
+    # binary ::= application {operator operand}, operator ::= "<" | "+" | "-" | "*"
+    # Precedence climbing: the operand after an operator is parsed with the next binding power up,
+    # so tighter operators are taken into it and operators of equal power associate to the left.
+    def binary(self, min_prec=1):
+        node = self.application()
+        while True:
+            op = BINARY_OPERATORS.get(self.cur_token.kind)
+            if op is None or OP_PRECEDENCE[op] < min_prec:
+                return node
             self.next_token()
-
-            expr = ''
-            while not self.check_token(TokenType.EOF):
-                expr += f' {self.cur_token.text}'
-                self.next_token()
-
-            return self.compiler.eval_fun(self.compiler.env, ident, expr)
-
-        # expression
-        elif self.check_token(TokenType.IDENT):
-            expr_1 = self.cur_token.text
-            expr_2 = ''
-            cur_op = None
+            node = BinOp(op, node, self.operand(OP_PRECEDENCE[op] + 1))
+
+    # The right operand of a binary operator may be an unparenthesized let, if or fun, as in ML.
+    def operand(self, min_prec):
+        if self.cur_token.kind in OPEN_TOKENS:
+            return self.expression()
+        return self.binary(min_prec)
+
+    # application ::= primary {primary}
+    def application(self):
+        node = self.primary()
+        while self.is_primary():
+            node = App(node, self.primary())
+        return node
+
+    # primary ::= number | "-" number | bool | ident | "(" expression ")"
+    def primary(self):
+        if self.check_token(TokenType.NUMBER):
+            node = Int(int(self.cur_token.text))
             self.next_token()
+            return node
 
-            while not self.check_token(TokenType.EOF):
-                if self.check_token(TokenType.PLUS):
-                    if cur_op is None:
-                        cur_op = OpType.PLUS
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} +'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.MINUS):
-                    if cur_op is None:
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} -'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.ASTERISK):
-                    if cur_op is None:
-                        cur_op = OpType.ASTERISK
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.ASTERISK
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.LT):
-                    if cur_op is None:
-                        cur_op = OpType.LT
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.IDENT) or self.check_token(TokenType.NUMBER):
-                    if cur_op is None:
-                        cur_op = OpType.APP
-                        expr_2 = self.cur_token.text
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = self.cur_token.text
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.OPEN_PAREN):
-                    if cur_op is None:
-                        cur_op = OpType.APP
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.APP:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-            if cur_op is None:
-                return self.compiler.eval_var(self.compiler.env, expr_1)
-            elif cur_op == OpType.PLUS:
-                return self.compiler.eval_plus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.MINUS:
-                return self.compiler.eval_minus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.ASTERISK:
-                return self.compiler.eval_times(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.APP:
-                return self.compiler.eval_app_base(self.compiler.env, expr_1, expr_2)
-
-        elif self.check_token(TokenType.NUMBER):
-            expr_1 = self.cur_token.text
-            expr_2 = ''
-            cur_op = None
+        elif self.check_token(TokenType.MINUS) and self.check_peek(TokenType.NUMBER):
             self.next_token()
-
-            while not self.check_token(TokenType.EOF):
-                if self.check_token(TokenType.PLUS):
-                    if cur_op is None:
-                        cur_op = OpType.PLUS
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} +'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.MINUS):
-                    if cur_op is None:
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} -'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.ASTERISK):
-                    if cur_op is None:
-                        cur_op = OpType.ASTERISK
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.LT):
-                    if cur_op is None:
-                        cur_op = OpType.LT
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.IDENT) or self.check_token(TokenType.NUMBER):
-                    if cur_op == OpType.PLUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.OPEN_PAREN):
-                    if cur_op == OpType.PLUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.APP:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-            if cur_op is None:
-                return self.compiler.eval_int(self.compiler.env, expr_1)
-            elif cur_op == OpType.PLUS:
-                return self.compiler.eval_plus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.MINUS:
-                return self.compiler.eval_minus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.ASTERISK:
-                return self.compiler.eval_times(self.compiler.env, expr_1, expr_2)
+            node = Int(-int(self.cur_token.text))
+            self.next_token()
+            return node
 
         elif self.check_token(TokenType.BOOL):
-            expr_1 = self.cur_token.text
-            return self.compiler.eval_bool(self.compiler.env, expr_1)
+            node = Bool(self.cur_token.text == 'true')
+            self.next_token()
+            return node
+
+        elif self.check_token(TokenType.IDENT):
+            ident = self.ident()
+            return Var(ident, self.resolve(ident))
 
         elif self.check_token(TokenType.OPEN_PAREN):
-            expr_1 = self.handle_paren('')
-            expr_2 = ''
-            cur_op = None
-
-            while not self.check_token(TokenType.EOF):
-                if self.check_token(TokenType.PLUS):
-                    if cur_op is None:
-                        cur_op = OpType.PLUS
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.PLUS
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} +'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.MINUS):
-                    if cur_op is None:
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.MINUS
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} -'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.ASTERISK):
-                    if cur_op is None:
-                        cur_op = OpType.ASTERISK
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.ASTERISK
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.LT:
-                        expr_2 = f'{expr_2} *'
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.LT):
-                    if cur_op is None:
-                        cur_op = OpType.LT
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} + {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} - {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} * {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = ''
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.IDENT) or self.check_token(TokenType.NUMBER):
-                    if cur_op is None:
-                        cur_op = OpType.APP
-                        expr_2 = self.cur_token.text
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        if expr_2 == '':
-                            expr_2 = self.cur_token.text
-                        else:
-                            expr_2 = f'{expr_2} {self.cur_token.text}'
-                        self.next_token()
-                        continue
-                    elif cur_op == OpType.APP:
-                        cur_op = OpType.LT
-                        expr_1 = f'{expr_1} {expr_2}'
-                        expr_2 = self.cur_token.text
-                        self.next_token()
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-                elif self.check_token(TokenType.OPEN_PAREN):
-                    if cur_op is None:
-                        cur_op = OpType.APP
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.PLUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.MINUS:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.ASTERISK:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    elif cur_op == OpType.APP:
-                        expr_2 = self.handle_paren(expr_2)
-                        continue
-                    else:
-                        self.abort("Invalid op")
-
-            if cur_op is None:
-                return self.compiler.eval_expr(self.compiler.env, expr_1)
-            elif cur_op == OpType.PLUS:
-                return self.compiler.eval_plus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.MINUS:
-                return self.compiler.eval_minus(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.ASTERISK:
-                return self.compiler.eval_times(self.compiler.env, expr_1, expr_2)
-            elif cur_op == OpType.APP:
-                return self.compiler.eval_app_base(self.compiler.env, expr_1, expr_2)
-
-        # This is not a valid statement. Error!
-        else:
-            self.abort("Invalid statement at " + self.cur_token.text + " (" + self.cur_token.kind.name + ")")
-
-    def handle_paren(self, expr):
-        stack = 1
-        if expr == '':
-            expr = self.cur_token.text
-        else:
-            expr = f'{expr} {self.cur_token.text}'
-        self.next_token()
-        while stack != 0:
-            if self.check_token(TokenType.OPEN_PAREN):
-                stack += 1
-                if expr == '':
-                    expr = self.cur_token.text
-                else:
-                    expr = f'{expr} {self.cur_token.text}'
-            elif self.check_token(TokenType.CLOSE_PAREN):
-                stack -= 1
-                expr = f'{expr} {self.cur_token.text}'
-            else:
-                if expr == '':
-                    expr = self.cur_token.text
-                else:
-                    expr = f'{expr} {self.cur_token.text}'
             self.next_token()
+            node = self.expression()
+            self.match(TokenType.CLOSE_PAREN)
+            return node
+
+        # This is not a valid expression. Error!
+        self.abort("Invalid expression at " + self.cur_token.text + " (" + self.cur_token.kind.name + ")")
+
+    def ident(self):
+        if not self.check_token(TokenType.IDENT):
+            self.abort("Expected IDENT, got " + self.cur_token.kind.name)
+        text = self.cur_token.text
         self.next_token()
+        return text
+
 
-        return expr
+PRIMARY_TOKENS = frozenset([TokenType.NUMBER, TokenType.BOOL, TokenType.IDENT, TokenType.OPEN_PAREN])
 
+OPEN_TOKENS = frozenset([TokenType.IF, TokenType.LET, TokenType.FUN])
 
-class OpType(enum.Enum):
-    PLUS = 1
-    MINUS = 2
-    ASTERISK = 3
-    LT = 4
-    APP = 5
+BINARY_OPERATORS = {
+    TokenType.LT: OpType.LT,
+    TokenType.PLUS: OpType.PLUS,
+    TokenType.MINUS: OpType.MINUS,
+    TokenType.ASTERISK: OpType.ASTERISK,
+}
@@ -0,0 +1,43 @@
+def format_value(value):
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return str(value)
+
+
+def format_environment(environment):
+    return ', '.join(f'{ident} = {format_value(value)}' for ident, value in environment)
+
+
+# Closure is the value of a fun expression: the environment it was defined in, its parameter and its body.
+class Closure:
+    __slots__ = ('environment', 'param', 'body')
+
+    def __init__(self, environment, param, body):
+        self.environment = environment
+        self.param = param
+        self.body = body
+
+    def __repr__(self):
+        return f'Closure({self})'
+
+    def __str__(self):
+        return f'({format_environment(self.environment)})[fun {self.param} -> {self.body}]'
+
+
+# RecClosure is the value bound by let rec; applying it also binds its own name inside the body.
+class RecClosure:
+    __slots__ = ('environment', 'name', 'param', 'body')
+
+    def __init__(self, environment, name, param, body):
+        self.environment = environment
+        self.name = name
+        self.param = param
+        self.body = body
+
+    def __repr__(self):
+        return f'RecClosure({self})'
+
+    def __str__(self):
+        return f'({format_environment(self.environment)})[rec {self.name} = fun {self.param} -> {self.body}]'
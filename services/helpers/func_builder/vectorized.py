@@ -0,0 +1,138 @@
+import functools
+
+import numpy as np
+
+from services.helpers.func_builder.environment import Environment
+from services.helpers.func_builder.nodes import *
+from services.helpers.func_builder.values import Closure, RecClosure, format_value
+
+
+# BatchEvaluator evaluates a syntax tree once for a whole batch of inputs, following the Compiler's value rules.
+# Variables may be bound to arrays whose first axis runs over the batch; +, -, * and < act element-wise.
+# An if on an array condition computes each branch only for the elements that take it, and merges the results,
+# so let rec loops whose depth differs between elements still terminate. Arithmetic follows NumPy dtypes.
+class BatchEvaluator:
+    def __init__(self, size):
+        self.size = size  # Length of the batch axis, or None when nothing is batched.
+
+    def evaluate(self, environment, node):
+        kind = type(node)
+        if kind is BinOp:
+            value_1 = self.evaluate(environment, node.left)
+            value_2 = self.evaluate(environment, node.right)
+            if node.op == OpType.PLUS:
+                return value_1 + value_2
+            elif node.op == OpType.MINUS:
+                return value_1 - value_2
+            elif node.op == OpType.ASTERISK:
+                return value_1 * value_2
+            return value_1 < value_2
+        elif kind is Var:
+            if node.index is None:
+                return environment.lookup(environment.index(node.name))
+            return environment.lookup(node.index)
+        elif kind is Int or kind is Bool:
+            return node.value
+        elif kind is App:
+            return self.apply(self.evaluate(environment, node.fun), self.evaluate(environment, node.arg))
+        elif kind is If:
+            return self.eval_if(environment, node)
+        elif kind is Let:
+            value = self.evaluate(environment, node.bound)
+            return self.evaluate(environment.extend(node.name, value), node.body)
+        elif kind is Fun:
+            return Closure(environment, node.param, node.body)
+        elif kind is LetRec:
+            closure = RecClosure(environment, node.name, node.param, node.fun_body)
+            return self.evaluate(environment.extend(node.name, closure), node.body)
+        raise TypeError(f'Unknown node: {node!r}')
+
+    def apply(self, closure, value):
+        if type(closure) is RecClosure:
+            return self.evaluate(closure.environment.extend(closure.name, closure).extend(closure.param, value),
+                                 closure.body)
+        elif type(closure) is Closure:
+            return self.evaluate(closure.environment.extend(closure.param, value), closure.body)
+        raise TypeError(f'{format_value(closure)} is not a function')
+
+    def eval_if(self, environment, node):
+        cond = self.evaluate(environment, node.cond)
+        if isinstance(cond, np.ndarray) and cond.ndim == 0:
+            cond = cond[()]
+        if not isinstance(cond, np.ndarray):
+            # Only true selects the then branch, as in the Compiler.
+            if cond is True or cond is np.True_:
+                return self.evaluate(environment, node.then)
+            return self.evaluate(environment, node.orelse)
+
+        mask = cond if cond.dtype == np.bool_ else np.zeros(cond.shape, dtype=np.bool_)
+        if mask.all():
+            return self.evaluate(environment, node.then)
+        elif not mask.any():
+            return self.evaluate(environment, node.orelse)
+
+        # Branches without calls are cheap and always terminate, so evaluate both over the batch.
+        if mask.ndim != 1 or (is_call_free(node.then) and is_call_free(node.orelse)):
+            return np.where(mask, self.evaluate(environment, node.then), self.evaluate(environment, node.orelse))
+
+        taken = np.flatnonzero(mask)
+        skipped = np.flatnonzero(~mask)
+        then = BatchEvaluator(len(taken)).evaluate(self.restrict_environment(environment, taken), node.then)
+        orelse = BatchEvaluator(len(skipped)).evaluate(self.restrict_environment(environment, skipped), node.orelse)
+
+        result = np.empty(self.size, dtype=np.result_type(then, orelse))
+        result[taken] = then
+        result[skipped] = orelse
+        return result
+
+    # Return the environment as seen by the batch elements at positions indices.
+    def restrict_environment(self, environment, indices):
+        return Environment.of((ident, self.restrict(value, indices)) for ident, value in environment)
+
+    def restrict(self, value, indices):
+        if isinstance(value, np.ndarray) and value.ndim > 0 and value.shape[0] == self.size:
+            return value[indices]
+        elif type(value) is Closure:
+            return Closure(self.restrict_environment(value.environment, indices), value.param, value.body)
+        elif type(value) is RecClosure:
+            return RecClosure(self.restrict_environment(value.environment, indices), value.name, value.param,
+                              value.body)
+        return value
+
+
+# Return true if evaluating node never applies a function.
+@functools.lru_cache(maxsize=None)
+def is_call_free(node):
+    kind = type(node)
+    if kind is App:
+        return False
+    elif kind is BinOp:
+        return is_call_free(node.left) and is_call_free(node.right)
+    elif kind is If:
+        return is_call_free(node.cond) and is_call_free(node.then) and is_call_free(node.orelse)
+    elif kind is Let:
+        return is_call_free(node.bound) and is_call_free(node.body)
+    elif kind is LetRec:
+        return is_call_free(node.body)
+    return True
+
+
+def batch_size(values):
+    for value in values:
+        if isinstance(value, np.ndarray) and value.ndim > 0:
+            return value.shape[0]
+    return None
+
+
+# Evaluate a parsed program with its free variables bound to arrays (or scalars) given by name.
+def eval_batch(tree, **columns):
+    environment = Environment.of((ident, np.asarray(value)) for ident, value in columns.items())
+    return BatchEvaluator(batch_size(value for _, value in environment)).evaluate(environment, tree)
+
+
+# Apply the function a parsed program evaluates to, such as a fun x -> ... cost model, to a whole array at once.
+def apply_batch(tree, argument, **columns):
+    argument = np.asarray(argument)
+    environment = Environment.of((ident, np.asarray(value)) for ident, value in columns.items())
+    evaluator = BatchEvaluator(batch_size([argument, *(value for _, value in environment)]))
+    return evaluator.apply(evaluator.evaluate(environment, tree), argument)
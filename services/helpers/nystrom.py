@@ -0,0 +1,128 @@
+import enum
+
+import numpy as np
+from helpers.spectral import laplacian_eigenpairs
+
+# Nyström vectors computed beyond the requested count; the Rayleigh-Ritz step picks the best count of them.
+OVERSAMPLE = 10
+
+# Subspace iterations with 2I - L that refine the Nyström vectors. On sparse graphs the landmark block holds few
+# edges, and the bare extension is poor; each iteration damps the unwanted directions by the eigenvalue gap.
+ITERATIONS = 2
+
+# Width of the random sketch of the rows that k-means++ sampling measures distances on.
+SKETCH_WIDTH = 32
+
+
+# LandmarkSampling selects how the landmark nodes of a Nyström embedding are drawn.
+class LandmarkSampling(enum.Enum):
+    UNIFORM = 1  # Uniformly without replacement.
+    KMEANS_PP = 2  # k-means++ seeding on a random sketch of the normalized rows, which spreads landmarks over clusters.
+
+
+# Return approximations of the `count` smallest eigenvalues of the normalized Laplacian of adjacency and their
+# eigenvectors, from the block of `landmarks` sampled nodes, and the residual norm ||L v - lambda v|| of each pair.
+# With M = D^-1/2 W D^-1/2, so that L = I - M, the eigenvectors of the landmark block of M are extended to all nodes
+# by the Nyström formula V = M[:, landmarks] U diag(1 / mu). The extensions span a subspace close to the wanted
+# eigenvectors, which `iterations` steps of subspace iteration bring closer, and a Rayleigh-Ritz step on L in that
+# subspace makes them orthonormal. Only the landmark columns of adjacency and (iterations + 1) products with L per
+# vector are used, never a full eigendecomposition.
+# L is symmetric, so each returned eigenvalue lies within its residual norm of an exact eigenvalue.
+def nystrom_eigenpairs(adjacency, count, landmarks, sampling=LandmarkSampling.UNIFORM, seed=None,
+                       oversample=OVERSAMPLE, iterations=ITERATIONS):
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    loops, scale, isolated = degree_scaling(adjacency)
+
+    nodes = sample_landmarks(adjacency, scale, min(landmarks, n), sampling, rng)
+    columns = adjacency[:, nodes]
+    core = dense(columns[nodes]) - np.diag(loops[nodes])
+    core *= scale[nodes, None] * scale[None, nodes]
+
+    # The largest eigenvalues of the block of M belong to the smallest of L.
+    mu, vectors = np.linalg.eigh(core)
+    kept = np.abs(mu) > 1e-10 * max(np.abs(mu).max(), 1)
+    mu, vectors = mu[kept][::-1][:count + oversample], vectors[:, kept][:, ::-1][:, :count + oversample]
+
+    weights = vectors / mu * scale[nodes, None]
+    extended = np.asarray(columns @ weights)
+    extended[nodes] -= loops[nodes, None] * weights
+    extended *= scale[:, None]
+
+    # A sparse landmark block can have fewer nonzero eigenvalues than vectors wanted; random directions fill in,
+    # and the subspace iterations turn them towards the eigenvectors.
+    missing = min(count + oversample, n) - extended.shape[1]
+    if missing > 0:
+        extended = np.hstack([extended, rng.standard_normal((n, missing))])
+
+    basis, _ = np.linalg.qr(extended)
+    for _ in range(iterations):
+        basis, _ = np.linalg.qr(2 * basis - laplacian_product(adjacency, loops, scale, isolated, basis))
+    product = laplacian_product(adjacency, loops, scale, isolated, basis)
+    eigenvalues, ritz = np.linalg.eigh(basis.T @ product)
+    eigenvalues, ritz = eigenvalues[:count], ritz[:, :count]
+    eigenvectors = basis @ ritz
+    residuals = np.linalg.norm(product @ ritz - eigenvectors * eigenvalues, axis=0)
+    return eigenvalues, eigenvectors, residuals
+
+
+# Whether an embedding with `landmarks` landmarks applies to tensor. It is meant for dense matrices much larger than
+# the landmarks; sparse graphs keep the exact sparse solvers, which are fast on them, as their landmark blocks hold
+# too few edges for the extension to be accurate.
+def use_landmarks(tensor, landmarks):
+    return bool(landmarks) and not hasattr(tensor, 'tocsr') and tensor.shape[0] > landmarks
+
+
+def nystrom_embedding(adjacency, count, landmarks, sampling=LandmarkSampling.UNIFORM, seed=None,
+                      iterations=ITERATIONS):
+    return nystrom_eigenpairs(adjacency, count, landmarks, sampling, seed, iterations=iterations)[1]
+
+
+# Return the self-loop weights of adjacency, D^-1/2 with 0 for isolated nodes, and the isolated nodes.
+# Self-loops are ignored, as in scipy.sparse.csgraph.laplacian.
+def degree_scaling(adjacency):
+    loops = np.asarray(adjacency.diagonal(), dtype=np.float64)
+    degree = np.asarray(adjacency.sum(axis=1), dtype=np.float64).ravel() - loops
+    isolated = degree == 0
+    scale = np.where(isolated, 0, 1 / np.sqrt(np.where(isolated, 1, degree)))
+    return loops, scale, isolated
+
+
+# Return L @ vectors for the normalized Laplacian L of adjacency without building L.
+def laplacian_product(adjacency, loops, scale, isolated, vectors):
+    scaled = vectors * scale[:, None]
+    off_diagonal = np.asarray(adjacency @ scaled) - loops[:, None] * scaled
+    return vectors * ~isolated[:, None] - off_diagonal * scale[:, None]
+
+
+def sample_landmarks(adjacency, scale, landmarks, sampling, rng):
+    if sampling == LandmarkSampling.KMEANS_PP:
+        from sklearn.cluster import kmeans_plusplus
+
+        sketch = np.asarray(adjacency @ rng.standard_normal((adjacency.shape[0], SKETCH_WIDTH))) * scale[:, None]
+        _, nodes = kmeans_plusplus(sketch, landmarks, random_state=int(rng.integers(2 ** 31)))
+        return np.sort(nodes)
+    return np.sort(rng.choice(adjacency.shape[0], landmarks, replace=False))
+
+
+def dense(matrix):
+    return matrix.toarray() if hasattr(matrix, 'toarray') else np.asarray(matrix, dtype=np.float64)
+
+
+# Compare the Nyström approximation with the exact eigenpairs from laplacian_eigenpairs, to validate a landmark
+# count on representative graphs. Reports the largest eigenvalue error next to its a posteriori bound (the largest
+# residual norm), and the sine of the largest principal angle between the approximate and exact eigenvectors.
+# The angle is only meaningful when the count-th eigenvalue is separated from the next.
+def nystrom_error(adjacency, count, landmarks, sampling=LandmarkSampling.UNIFORM, seed=None,
+                  iterations=ITERATIONS):
+    eigenvalues, eigenvectors, residuals = nystrom_eigenpairs(adjacency, count, landmarks, sampling, seed,
+                                                              iterations=iterations)
+    exact_values, exact_vectors = laplacian_eigenpairs(adjacency, count)
+    cosines = np.linalg.svd(exact_vectors.T @ eigenvectors, compute_uv=False)
+    return {
+        'size': adjacency.shape[0],
+        'landmarks': min(landmarks, adjacency.shape[0]),
+        'eigenvalue_error': float(np.abs(eigenvalues - exact_values).max()),
+        'residual_bound': float(residuals.max()),
+        'subspace_sine': float(np.sqrt(max(0.0, 1 - cosines.min() ** 2))),
+    }
@@ -0,0 +1,142 @@
+import collections
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from helpers.nystrom import LandmarkSampling, nystrom_embedding, use_landmarks
+from helpers.spectral import DENSE_THRESHOLD, EigenSolver, batched_embeddings, laplacian_embedding
+
+# Environment variables read by the BLAS and OpenMP runtimes when they load.
+BLAS_THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS',
+                         'VECLIB_MAXIMUM_FRAMEWORK_THREADS', 'NUMEXPR_NUM_THREADS']
+
+# Thread limits of the current worker process; kept so that they stay in force.
+worker_limits = None
+
+
+# Cap the BLAS threads of a worker process, so that workers * blas_threads does not exceed the cores.
+# The variables cover libraries loaded later, such as SciPy's own BLAS; threadpoolctl, installed with
+# scikit-learn, also caps the ones already loaded with NumPy.
+def init_worker(blas_threads):
+    global worker_limits
+    if not blas_threads:
+        return
+    for variable in BLAS_THREAD_VARIABLES:
+        os.environ[variable] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    worker_limits = threadpool_limits(blas_threads)
+
+
+def create_executor(workers=None, blas_threads=1):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                  initargs=(blas_threads,))
+
+
+# SharedMatrix copies a dense array, or the data, indices and indptr of a scipy.sparse matrix, into shared memory
+# once. Its handle is a few names and shapes, so a worker receives the matrix by attaching instead of unpickling it.
+# The owner must call release when the workers are done.
+class SharedMatrix:
+    def __init__(self, matrix):
+        self.sparse = hasattr(matrix, 'tocsr')
+        if self.sparse:
+            matrix = matrix.tocsr()
+            arrays = [matrix.data, matrix.indices, matrix.indptr]
+        else:
+            arrays = [np.asarray(matrix)]
+
+        self.blocks = []
+        specs = []
+        for array in arrays:
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, block.buf)[...] = array
+            self.blocks.append(block)
+            specs.append((block.name, array.dtype.str, array.shape))
+        self.handle = (self.sparse, matrix.shape, specs)
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+# Return the matrix of a SharedMatrix handle as views of the shared blocks, and the blocks to close afterwards.
+def attach(handle):
+    sparse, shape, specs = handle
+    blocks = [shared_memory.SharedMemory(name) for name, _, _ in specs]
+    arrays = [np.ndarray(array_shape, dtype, block.buf) for block, (_, dtype, array_shape) in zip(blocks, specs)]
+    if not sparse:
+        return arrays[0], blocks
+
+    import scipy.sparse as sp
+
+    return sp.csr_matrix(tuple(arrays), shape=shape, copy=False), blocks
+
+
+# Worker task: return the spectral embeddings of the shared matrices of handles, in order.
+def embed_shared(handles, count, dense_threshold, solver, landmarks, sampling):
+    tensors = []
+    blocks = []
+    try:
+        for handle in handles:
+            tensor, tensor_blocks = attach(handle)
+            tensors.append(tensor)
+            blocks.extend(tensor_blocks)
+
+        def solve(tensor):
+            if use_landmarks(tensor, landmarks):
+                return nystrom_embedding(tensor, count, landmarks, sampling)
+            return laplacian_embedding(tensor, count, solver, dense_threshold)
+
+        # The embeddings are new arrays, so they stay valid after the blocks are closed.
+        return batched_embeddings(tensors, count, dense_threshold, solve)
+    finally:
+        del tensors
+        for block in blocks:
+            block.close()
+
+
+# Split the positions of tensors into worker tasks: every large or sparse matrix is a task of its own, and small
+# dense matrices of the same shape, which batched_embeddings decomposes together, are split into `workers` tasks.
+def partition(tensors, dense_threshold, workers):
+    groups = collections.defaultdict(list)  # (shape, sparse) -> positions in tensors
+    for position, tensor in enumerate(tensors):
+        groups[np.shape(tensor), hasattr(tensor, 'tocsr')].append(position)
+
+    tasks = []
+    for (shape, sparse), positions in groups.items():
+        size = 1 if shape[0] > dense_threshold or sparse else -(-len(positions) // workers)
+        tasks.extend(positions[start:start + size] for start in range(0, len(positions), size))
+    # Start the largest matrices first, so they do not finish last on an otherwise idle pool.
+    tasks.sort(key=lambda task: np.shape(tensors[task[0]])[0], reverse=True)
+    return tasks
+
+
+# Return the spectral embedding of every matrix in tensors, as batched_embeddings does, computed by the processes
+# of executor. The matrices are passed through shared memory, which is released once every task has finished.
+# With landmarks, large dense matrices get a Nyström embedding, as in Estimator.embed.
+def parallel_embeddings(executor, tensors, count, workers, dense_threshold=DENSE_THRESHOLD,
+                        solver=EigenSolver.EIGSH, landmarks=None, sampling=LandmarkSampling.UNIFORM):
+    shared = []
+    futures = []
+    try:
+        for tensor in tensors:
+            shared.append(SharedMatrix(tensor))
+        for positions in partition(tensors, dense_threshold, workers):
+            handles = [shared[position].handle for position in positions]
+            future = executor.submit(embed_shared, handles, count, dense_threshold, solver, landmarks, sampling)
+            futures.append((positions, future))
+
+        embeddings = [None] * len(tensors)
+        for positions, future in futures:
+            for position, embedding in zip(positions, future.result()):
+                embeddings[position] = embedding
+        return embeddings
+    finally:
+        concurrent.futures.wait([future for _, future in futures])
+        for matrix in shared:
+            matrix.release()
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+# RunningMean averages rows added in chunks into a buffer allocated once, so memory does not grow with the rows.
+class RunningMean:
+    def __init__(self, width, dtype=np.float32):
+        self.total = np.zeros(width, dtype=dtype)
+        self.count = 0
+
+    def add(self, rows):
+        np.add(self.total, rows.sum(axis=0), out=self.total, casting='unsafe')
+        self.count += rows.shape[0]
+
+    def reset(self):
+        self.total.fill(0)
+        self.count = 0
+
+    def value(self):
+        if self.count == 0:
+            return np.zeros_like(self.total)
+        return self.total / self.total.dtype.type(self.count)
+
+
+# StreamingReducer projects spectral embeddings onto principal components that are updated as embeddings arrive,
+# and averages the projected rows of the current window. The components are kept across windows.
+# scikit-learn's IncrementalPCA needs a fixed number of components, which defaults to the width of the first
+# embedding; a chunk with fewer rows than components is projected without updating them.
+class StreamingReducer:
+    def __init__(self, n_components=None, dtype=np.float32):
+        self.n_components = n_components
+        self.dtype = dtype
+        self.pca = None
+        self.window = None
+
+    def add(self, embedding):
+        embedding = align_signs(np.asarray(embedding, dtype=np.float64))
+        if self.pca is None:
+            from sklearn.decomposition import IncrementalPCA
+
+            self.pca = IncrementalPCA(self.n_components or embedding.shape[1])
+
+        if embedding.shape[0] >= self.pca.n_components:
+            self.pca.partial_fit(embedding)
+        if not hasattr(self.pca, 'components_'):
+            return
+
+        reduced = self.pca.transform(embedding)
+        if self.window is None:
+            self.window = RunningMean(reduced.shape[1], self.dtype)
+        self.window.add(reduced)
+
+    # Start averaging a new window; the principal components carry over.
+    def reset(self):
+        if self.window is not None:
+            self.window.reset()
+
+    def mean(self):
+        if self.window is None:
+            return np.zeros(0, dtype=self.dtype)
+        return self.window.value()
+
+
+# Eigenvectors are only defined up to sign; flip each column so its largest entry is positive,
+# so that the same eigenvector from successive cycles points the same way.
+def align_signs(vectors):
+    rows = np.abs(vectors).argmax(axis=0)
+    signs = np.sign(vectors[rows, np.arange(vectors.shape[1])])
+    signs[signs == 0] = 1
+    return vectors * signs
@@ -0,0 +1,228 @@
+import collections
+import enum
+
+import numpy as np
+
+# SciPy is imported inside the solvers, so that importing this module for EigenSolver stays cheap.
+
+# Graphs with at most this many nodes are solved densely; below it an iterative solver has no advantage.
+DENSE_THRESHOLD = 500
+
+# In shift-invert mode eigsh looks for eigenvalues nearest -SHIFT. The normalized Laplacian is singular with its
+# spectrum in [0, 2], so a small negative shift keeps the shifted matrix factorizable.
+SHIFT = 1e-3
+
+
+# EigenSolver selects how the smallest eigenpairs of a Laplacian are computed.
+class EigenSolver(enum.Enum):
+    DENSE = 1  # np.linalg.eigh on the dense matrix: O(n^3) time and O(n^2) memory.
+    EIGSH = 2  # ARPACK Lanczos for the largest eigenvalues of 2I - L, which are the smallest of L; only multiplies.
+    SHIFT_INVERT = 3  # ARPACK in shift-invert mode; fast when the sparse LU factors stay sparse, as for banded graphs.
+    LOBPCG = 4  # Block preconditioned conjugate gradient; only multiplies, and can start from earlier eigenvectors.
+
+
+# Return the `count` smallest eigenvalues of the normalized Laplacian of adjacency, in ascending order,
+# and the matching eigenvectors as columns. adjacency may be a dense array or a scipy.sparse matrix.
+def laplacian_eigenpairs(adjacency, count, solver=EigenSolver.EIGSH, dense_threshold=DENSE_THRESHOLD,
+                         tol=None, maxiter=None):
+    lap = normalized_laplacian(adjacency)
+    n = lap.shape[0]
+    count = min(count, n)
+
+    # ARPACK needs count < n, and LOBPCG needs several times more nodes than eigenpairs.
+    if solver == EigenSolver.DENSE or n <= dense_threshold or count >= n - 1 \
+            or (solver == EigenSolver.LOBPCG and 5 * count >= n):
+        return dense_eigenpairs(lap, count)
+    elif solver == EigenSolver.LOBPCG:
+        return lobpcg_eigenpairs(lap, count, tol, maxiter)
+    elif solver == EigenSolver.SHIFT_INVERT:
+        return shift_invert_eigenpairs(lap, count, tol, maxiter)
+    return eigsh_eigenpairs(lap, count, tol, maxiter)
+
+
+def normalized_laplacian(adjacency):
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import laplacian
+
+    return laplacian(sp.csr_matrix(adjacency, dtype=np.float64), normed=True).tocsr()
+
+
+def dense_eigenpairs(lap, count):
+    import scipy.sparse as sp
+
+    eigenvalues, eigenvectors = np.linalg.eigh(lap.toarray() if sp.issparse(lap) else lap)
+    return eigenvalues[:count], eigenvectors[:, :count]
+
+
+def eigsh_eigenpairs(lap, count, tol=None, maxiter=None):
+    import scipy.sparse as sp
+    from scipy.sparse.linalg import eigsh
+
+    flipped = (2 * sp.identity(lap.shape[0], format='csr') - lap).tocsr()
+    eigenvalues, eigenvectors = eigsh(flipped, k=count, which='LA', tol=tol or 0, maxiter=maxiter)
+    eigenvalues = 2 - eigenvalues
+    order = np.argsort(eigenvalues)
+    return eigenvalues[order], eigenvectors[:, order]
+
+
+def shift_invert_eigenpairs(lap, count, tol=None, maxiter=None):
+    from scipy.sparse.linalg import eigsh
+
+    eigenvalues, eigenvectors = eigsh(lap.tocsc(), k=count, sigma=-SHIFT, which='LM', tol=tol or 0, maxiter=maxiter)
+    order = np.argsort(eigenvalues)
+    return eigenvalues[order], eigenvectors[:, order]
+
+
+def lobpcg_eigenpairs(lap, count, tol=None, maxiter=None, initial=None):
+    from scipy.sparse.linalg import lobpcg
+
+    if initial is None:
+        initial = np.random.default_rng(0).standard_normal((lap.shape[0], count))
+    eigenvalues, eigenvectors = lobpcg(lap, initial, tol=tol, maxiter=maxiter or 200, largest=False)
+    order = np.argsort(eigenvalues)
+    return eigenvalues[order], eigenvectors[:, order]
+
+
+# Return the spectral embedding of adjacency: the eigenvectors of its `count` smallest Laplacian eigenvalues.
+def laplacian_embedding(adjacency, count, solver=EigenSolver.EIGSH, dense_threshold=DENSE_THRESHOLD):
+    return laplacian_eigenpairs(adjacency, count, solver, dense_threshold)[1]
+
+
+# Return the normalized Laplacians of a stack of dense adjacency matrices of shape (batch, n, n),
+# matching scipy.sparse.csgraph.laplacian(normed=True) on each: self-loops are ignored and isolated nodes get 0.
+def batched_laplacian(adjacency):
+    adjacency = np.asarray(adjacency, dtype=np.float64)
+    nodes = np.arange(adjacency.shape[-1])
+    degree = adjacency.sum(axis=1) - adjacency[:, nodes, nodes]
+    isolated = degree == 0
+    scale = np.sqrt(np.where(isolated, 1, degree))
+
+    lap = adjacency / scale[:, None, :]
+    lap /= scale[:, :, None]
+    lap *= -1
+    lap[:, nodes, nodes] = 1 - isolated
+    return lap
+
+
+# Return the spectral embedding of every matrix in tensors, in order, with `count` eigenvectors each.
+# Matrices of the same shape with at most dense_threshold nodes are stacked, and their Laplacians are built
+# and decomposed in one batched np.linalg.eigh call per shape. Larger and scipy.sparse matrices go through solve
+# one at a time, which defaults to laplacian_embedding.
+def batched_embeddings(tensors, count, dense_threshold=DENSE_THRESHOLD, solve=None):
+    if solve is None:
+        solve = lambda tensor: laplacian_embedding(tensor, count, dense_threshold=dense_threshold)
+
+    groups = collections.defaultdict(list)  # (shape, sparse) -> positions in tensors
+    for position, tensor in enumerate(tensors):
+        groups[np.shape(tensor), hasattr(tensor, 'tocsr')].append(position)
+
+    embeddings = [None] * len(tensors)
+    for (shape, sparse), positions in groups.items():
+        if shape[0] > dense_threshold or sparse:
+            for position in positions:
+                embeddings[position] = solve(tensors[position])
+            continue
+
+        _, eigenvectors = np.linalg.eigh(batched_laplacian(np.stack([tensors[position] for position in positions])))
+        for position, vectors in zip(positions, eigenvectors):
+            embeddings[position] = vectors[:, :count]
+    return embeddings
+
+
+# SpectralTracker follows the smallest Laplacian eigenpairs of a graph that changes a little between updates.
+# It keeps the last Laplacian and eigenvectors, and solves the next graph from them instead of from scratch:
+# - if the Laplacian moved by at most perturbation_threshold (Frobenius norm), the old eigenvectors and their
+#   first-order corrections span a small subspace, and a Rayleigh-Ritz step in it is tried first;
+# - if that misses tol, or the change was larger, Lanczos starts from the old eigenvectors, which already lie
+#   almost in the wanted subspace and converge in a fraction of the products a random start needs;
+# - a new size or count is solved from a random start, and graphs up to dense_threshold nodes densely.
+# Every update appends a record of what it did to history, including the products with the Laplacian it took.
+class SpectralTracker:
+    def __init__(self, tol=1e-6, perturbation_threshold=1e-2, maxiter=None, dense_threshold=DENSE_THRESHOLD,
+                 history=1000):
+        self.tol = tol  # Largest residual norm ||L v - lambda v|| accepted from a Rayleigh-Ritz step; Lanczos tolerance.
+        self.perturbation_threshold = perturbation_threshold
+        self.maxiter = maxiter
+        self.dense_threshold = dense_threshold
+
+        self.laplacian = None
+        self.eigenvalues = None
+        self.eigenvectors = None
+        self.history = collections.deque(maxlen=history)
+
+    # Return the `count` smallest eigenvalues of the normalized Laplacian of adjacency and their eigenvectors.
+    def update(self, adjacency, count):
+        lap = normalized_laplacian(adjacency)
+        n = lap.shape[0]
+        count = min(count, n)
+        change = None
+        products = 0
+
+        if n <= self.dense_threshold or count >= n - 1:
+            method = 'dense'
+            eigenvalues, eigenvectors = dense_eigenpairs(lap, count)
+        elif self.laplacian is None or self.laplacian.shape != lap.shape or self.eigenvectors.shape[1] != count:
+            method = 'cold'
+            eigenvalues, eigenvectors, products = lanczos(lap, count, self.tol, self.maxiter)
+        else:
+            delta = lap - self.laplacian
+            change = float(np.sqrt(delta.multiply(delta).sum()))
+            eigenvalues = None
+
+            if change <= self.perturbation_threshold:
+                method = 'perturbation'
+                basis = np.hstack([self.eigenvectors, delta @ self.eigenvectors])
+                eigenvalues, eigenvectors = rayleigh_ritz(lap, basis, count)
+                products = 2 * count
+                if residual_norm(lap, eigenvalues, eigenvectors) > self.tol:
+                    eigenvalues = None
+
+            if eigenvalues is None:
+                method = 'warm'
+                eigenvalues, eigenvectors, warm_products = lanczos(lap, count, self.tol, self.maxiter,
+                                                                   self.eigenvectors)
+                products += warm_products
+
+        self.laplacian = lap
+        self.eigenvalues = eigenvalues
+        self.eigenvectors = eigenvectors
+        self.history.append({
+            'method': method,
+            'size': n,
+            'change': change,
+            'products': products,
+            'residual': residual_norm(lap, eigenvalues, eigenvectors),
+        })
+        return eigenvalues, eigenvectors
+
+
+# Return the `count` smallest Ritz pairs of lap in the span of the columns of basis.
+def rayleigh_ritz(lap, basis, count):
+    basis, _ = np.linalg.qr(basis)
+    eigenvalues, vectors = np.linalg.eigh(basis.T @ (lap @ basis))
+    return eigenvalues[:count], basis @ vectors[:, :count]
+
+
+def residual_norm(lap, eigenvalues, eigenvectors):
+    return float(np.linalg.norm(lap @ eigenvectors - eigenvectors * eigenvalues, axis=0).max())
+
+
+# Run eigsh on 2I - L as eigsh_eigenpairs does, starting from the sum of the columns of initial when given,
+# and return the eigenpairs and the number of products with the matrix it took.
+def lanczos(lap, count, tol, maxiter, initial=None):
+    import scipy.sparse as sp
+    from scipy.sparse.linalg import LinearOperator, eigsh
+
+    flipped = (2 * sp.identity(lap.shape[0], format='csr') - lap).tocsr()
+    products = [0]
+
+    def matvec(vector):
+        products[0] += 1
+        return flipped @ vector
+
+    operator = LinearOperator(flipped.shape, matvec=matvec, dtype=flipped.dtype)
+    start = None if initial is None else initial.sum(axis=1)
+    eigenvalues, eigenvectors = eigsh(operator, k=count, which='LA', tol=tol, maxiter=maxiter, v0=start)
+    eigenvalues = 2 - eigenvalues
+    order = np.argsort(eigenvalues)
+    return eigenvalues[order], eigenvectors[:, order], products[0]
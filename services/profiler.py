@@ -1,7 +1,6 @@
 import psutil
 import subprocess
 import time
-import pandas as pd
 import os
 import tempfile
 
@@ -31,6 +30,9 @@ class Profiler:
             output_file.write(content)
 
     def execute_and_profile(self, duration=5):
+        # pandas is only needed here; importing it on first use keeps the module cheap to load
+        import pandas as pd
+
         # Start the binary executable as a subprocess
         process = subprocess.Popen(self.binary_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         pid = process.pid
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from services.helpers.batching import MicroBatcher
+
+
+def test_full_batch_is_flushed_at_once():
+    batcher = MicroBatcher(max_batch=3, max_wait=60, min_linger=60)
+    for item in range(5):
+        batcher.put(item)
+    assert batcher.get_batch(1) == [0, 1, 2]
+    assert batcher.history[-1]['reason'] == 'full'
+    assert batcher.stats()['pending'] == 2
+
+
+# A lone item waits min_linger, not the whole max_wait window.
+def test_lone_item_lingers():
+    batcher = MicroBatcher(max_batch=10, max_wait=60, min_linger=0.05)
+    batcher.put('a')
+    start = time.monotonic()
+    assert batcher.get_batch(1) == ['a']
+    assert time.monotonic() - start < 5
+    assert batcher.history[-1]['reason'] == 'linger'
+
+
+# Items that keep arriving within min_linger are cut off by max_wait.
+def test_steady_stream_is_cut_at_max_wait():
+    batcher = MicroBatcher(max_batch=1000, max_wait=0.2, min_linger=1.0)
+    stop = threading.Event()
+
+    def produce():
+        while not stop.is_set():
+            batcher.put(1)
+            time.sleep(0.01)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    try:
+        batch = batcher.get_batch(5)
+    finally:
+        stop.set()
+        producer.join()
+    assert batch and batcher.history[-1]['reason'] == 'max_wait'
+
+
+def test_timeout_and_close():
+    batcher = MicroBatcher(max_wait=60, min_linger=60)
+    assert batcher.get_batch(0.01) == []
+    batcher.put('a')
+    threading.Timer(0.05, batcher.close).start()
+    assert batcher.get_batch(5) == ['a']
+    assert batcher.history[-1]['reason'] == 'closed'
+    assert batcher.get_batch() == []
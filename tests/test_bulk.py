@@ -0,0 +1,23 @@
+import signal
+
+import pytest
+
+from services.helpers.func_builder.bulk import evaluate_chunk, evaluate_program
+from services.helpers.func_builder.compiler import EvalMode
+
+
+# A bad entry fails on its own; the rest of its chunk is still evaluated.
+def test_bad_program_fails_alone():
+    results = evaluate_chunk(enumerate(['1 + 2', 5, 'let x = 3 in x * x']), EvalMode.VALUE, 10.0)
+    assert [result['value'] for result in results] == ['3', None, '9']
+    assert results[1]['error'].startswith('TypeError')
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='no SIGALRM')
+@pytest.mark.parametrize('timeout', [float('inf'), 1e400, -1.0], ids=['inf', 'overflow', 'negative'])
+def test_rejected_timeout_restores_handler(timeout):
+    handler = signal.getsignal(signal.SIGALRM)
+    result = evaluate_program(0, '1 + 2', EvalMode.VALUE, timeout)
+    assert result['value'] is None and result['error'] is not None
+    assert signal.getsignal(signal.SIGALRM) is handler
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import scipy.sparse as sp
+
+from services.helpers.content_cache import EmbeddingCache, content_key
+from services.helpers.encoding import decode_matrix, encode_matrix, receive_matrix
+
+
+def test_key_depends_on_content_only():
+    matrix = np.random.default_rng(0).random((6, 6))
+    data = encode_matrix(matrix)
+    assert content_key(matrix) == content_key(decode_matrix(data))
+    assert content_key(matrix) == content_key(receive_matrix(io.BytesIO(data), len(data), spool_threshold=0))
+
+    changed = matrix.copy()
+    changed[0, 1] += 1e-12
+    assert content_key(changed) != content_key(matrix)
+    assert content_key(matrix.astype(np.float32)) != content_key(matrix)
+    assert content_key(sp.csr_matrix(matrix)) != content_key(matrix)
+
+
+# The eigenvector stack an embedding is sliced from must not stay alive in the cache.
+def test_stores_a_compact_copy():
+    stack = np.zeros((4, 400, 400))
+    embedding = stack[1][:, :2]
+    cache = EmbeddingCache()
+    cache.put(b'key', embedding)
+
+    stored = cache.get(b'key')
+    assert stored.base is None and not np.shares_memory(stored, stack)
+    assert np.array_equal(stored, embedding) and not stored.flags.writeable
+    assert cache.stats()['bytes'] == embedding.nbytes
+
+
+def test_evicts_least_recently_used_within_budget():
+    cache = EmbeddingCache(max_bytes=3 * 80)
+    for key in (b'a', b'b', b'c'):
+        cache.put(key, np.zeros(10))
+    assert cache.get(b'a') is not None
+    cache.put(b'd', np.zeros(10))
+
+    assert cache.get(b'b') is None
+    assert all(cache.get(key) is not None for key in (b'a', b'c', b'd'))
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['bytes'] == 240 and stats['evictions'] == 1
+    assert stats['hits'] == 4 and stats['misses'] == 1 and stats['hit_rate'] == 0.8
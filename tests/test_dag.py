@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.func_builder import CORPUS, count_judgments
+from services.helpers.func_builder.compiler import Compiler
+from services.helpers.func_builder.dag import dump_derivation, expand_derivation, load_dag, share_derivation
+from services.helpers.func_builder.derivation import render_derivation
+
+
+def derive(program):
+    compiler = Compiler(f' |- {program}')
+    return compiler.eval_node(compiler.environment, compiler.tree)[1]
+
+
+# A serialized derivation expands back to exactly the text of the derivation it was made from.
+@pytest.mark.parametrize('name', sorted(CORPUS))
+def test_round_trip(name):
+    derivation = derive(CORPUS[name])
+    data = dump_derivation(derivation)
+    assert expand_derivation(data) == render_derivation(derivation)
+    assert expand_derivation(data, indent='  ') == render_derivation(derivation, indent='  ')
+
+
+def test_repeated_judgments_are_stored_once():
+    derivation = derive(CORPUS['fibonacci'])
+    dag = share_derivation(derivation)
+    assert len(dag) < count_judgments(derivation)
+    assert len(load_dag(dump_derivation(derivation))) == len(dag)
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        load_dag(b'not a derivation')
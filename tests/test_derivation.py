@@ -0,0 +1,45 @@
+import socket
+import sys
+
+from services.helpers.func_builder.compiler import Compiler
+from services.helpers.func_builder.derivation import render_derivation, send_derivation
+
+
+def derive(program):
+    return Compiler(f' |- {program}').evaluate()[1]
+
+
+def test_render():
+    assert render_derivation(derive('let x = 1 in x + 2')) == (
+        '|- let x = 1 in x + 2 evalto 3 by E-Let {\n'
+        '    |- 1 evalto 1 by E-Int {};\n'
+        '    x = 1 |- x + 2 evalto 3 by E-Plus {\n'
+        '        x = 1 |- x evalto 1 by E-Var1 {};\n'
+        '        x = 1 |- 2 evalto 2 by E-Int {};\n'
+        '        1 plus 2 is 3 by B-Plus {};\n'
+        '    };\n'
+        '};\n'
+    )
+
+
+def test_send_writes_the_rendered_text():
+    derivation = derive('let rec f = fun n -> if n < 1 then 0 else n + f (n - 1) in f 5')
+    sender, receiver = socket.socketpair()
+    with receiver:
+        with sender:
+            send_derivation(derivation, sender)
+        data = b''.join(iter(lambda: receiver.recv(65536), b''))
+    assert data.decode('utf-8') == render_derivation(derivation)
+
+
+# Writing walks the tree with an explicit stack, so depth is not bounded by Python's recursion limit.
+# The expressions here are shallow while the derivation is hundreds of judgments deep.
+def test_deep_derivation():
+    derivation = derive('let rec f = fun n -> if n < 1 then 0 else 1 + f (n - 1) in f 100')
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(200)
+    try:
+        text = render_derivation(derivation)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert text.count('by E-AppRec') == 101
@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from services.helpers.encoding import decode_matrix, encode_matrix, read_header, receive_matrix, sections
+
+DENSE_MATRICES = [
+    np.arange(16, dtype=np.float64).reshape(4, 4),
+    np.random.default_rng(0).random((7, 7)).astype(np.float32),
+    np.arange(9, dtype='>i8').reshape(3, 3),
+    np.zeros((0, 0)),
+]
+
+SPARSE_MATRICES = [
+    sp.random(30, 30, density=0.1, format='csr', random_state=0),
+    sp.csr_matrix((5, 5), dtype=np.float32),
+]
+
+
+def receive(data, spool):
+    return receive_matrix(io.BytesIO(data), len(data), spool_threshold=0 if spool else len(data))
+
+
+@pytest.mark.parametrize('spool', [False, True])
+@pytest.mark.parametrize('matrix', DENSE_MATRICES)
+def test_dense_round_trip(matrix, spool):
+    decoded = receive(encode_matrix(matrix), spool)
+    assert decoded.shape == matrix.shape and decoded.dtype == matrix.dtype.newbyteorder('<')
+    assert np.array_equal(decoded, matrix)
+    assert not decoded.flags.writeable
+
+
+@pytest.mark.parametrize('spool', [False, True])
+@pytest.mark.parametrize('matrix', SPARSE_MATRICES)
+def test_sparse_round_trip(matrix, spool):
+    decoded = receive(encode_matrix(matrix), spool)
+    assert sp.isspmatrix_csr(decoded) and decoded.shape == matrix.shape
+    assert (decoded != matrix).nnz == 0
+
+
+def test_spooled_matrix_is_memory_mapped():
+    matrix = np.eye(8)
+    decoded = receive(encode_matrix(matrix), spool=True)
+    assert isinstance(decoded.base, np.memmap) or isinstance(decoded, np.memmap)
+
+
+def test_decoding_does_not_copy():
+    data = encode_matrix(np.eye(8))
+    assert np.shares_memory(decode_matrix(data), np.frombuffer(data, np.uint8))
+
+
+def corrupt(data, section, position, value):
+    dtype, _, offset = sections(*read_header(data), len(data))[section]
+    array = np.frombuffer(data, np.uint8).copy()
+    array[offset + position * dtype.itemsize:offset + (position + 1) * dtype.itemsize] = \
+        np.array([value], dtype).view(np.uint8)
+    return array.tobytes()
+
+
+@pytest.mark.parametrize('spool', [False, True])
+@pytest.mark.parametrize('data', [
+    b'',
+    b'XXXX' + bytes(28),
+    encode_matrix(np.ones((3, 4))),
+    encode_matrix(np.ones((2, 2, 2))),
+    encode_matrix(np.ones(3)),
+    encode_matrix(np.eye(4))[:40],
+    corrupt(encode_matrix(sp.csr_matrix(np.eye(4))), 1, 0, 9),
+    corrupt(encode_matrix(sp.csr_matrix(np.eye(4))), 1, 0, -1),
+    corrupt(encode_matrix(sp.csr_matrix(np.eye(4))), 2, 0, 1),
+    corrupt(encode_matrix(sp.csr_matrix(np.eye(4))), 2, 2, 4),
+], ids=['empty', 'magic', 'not_square', 'three_dimensional', 'vector', 'truncated', 'index_too_large',
+        'negative_index', 'indptr_start', 'indptr_decreasing'])
+def test_rejects_invalid_bodies(data, spool):
+    with pytest.raises(ValueError):
+        receive(data, spool)
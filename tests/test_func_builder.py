@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from benchmarks.func_builder import CORPUS
+from services.helpers.func_builder.compiler import Compiler, EvalMode
+
+# Programs whose native code once lost the grouping of a let operand or chained a comparison.
+REGRESSIONS = [
+    '(fun a -> a * (let z = a in z + 2)) 3',
+    '(fun a -> 2 * (let rec g = fun n -> n in g a + 1)) 3',
+    '(fun a -> if (let z = a in z < 5) then 1 else 0) 3',
+    '(fun a -> (let z = a in z) < (let y = 1 in y + 4)) 3',
+    '(1) + (2)',
+]
+
+
+# Generate a random well-typed int program; every variable in names is bound to an int.
+def random_int(rng, depth, names):
+    choice = rng.randrange(9 if depth > 0 else 2)
+    if choice == 0 or not names and choice == 1:
+        value = rng.randrange(-3, 10)
+        return f'({value})' if value < 0 else str(value)
+    elif choice == 1:
+        return rng.choice(names)
+    elif choice <= 3:
+        op = rng.choice(['+', '-', '*'])
+        return f'({random_int(rng, depth - 1, names)} {op} {random_int(rng, depth - 1, names)})'
+    elif choice == 4:
+        name = f'v{len(names)}'
+        return f'(let {name} = {random_int(rng, depth - 1, names)} in {random_int(rng, depth - 1, names + [name])})'
+    elif choice == 5:
+        return (f'(if {random_bool(rng, depth - 1, names)} then {random_int(rng, depth - 1, names)} '
+                f'else {random_int(rng, depth - 1, names)})')
+    elif choice == 6:
+        name = f'v{len(names)}'
+        return f'((fun {name} -> {random_int(rng, depth - 1, names + [name])}) {random_int(rng, depth - 1, names)})'
+    elif choice == 7:
+        name, param = f'g{len(names)}', f'v{len(names)}'
+        step = random_int(rng, depth - 1, names + [param])
+        return (f'(let rec {name} = fun {param} -> if {param} < 1 then {step} else {param} + {name} ({param} - 1) '
+                f'in {name} {rng.randrange(5)})')
+    return f'(if {random_bool(rng, depth - 1, names)} then 1 else 0)'
+
+
+def random_bool(rng, depth, names):
+    choice = rng.randrange(3)
+    if choice == 0:
+        return rng.choice(['true', 'false'])
+    elif choice == 1:
+        return f'{random_int(rng, depth, names)} < {random_int(rng, depth, names)}'
+    name = f'v{len(names)}'
+    return f'(let {name} = {random_int(rng, depth, names)} in {name} < {random_int(rng, depth, names + [name])})'
+
+
+def random_programs(count, seed=0):
+    rng = random.Random(seed)
+    return [random_int(rng, 4, []) for _ in range(count)]
+
+
+PROGRAMS = list(CORPUS.values()) + REGRESSIONS + random_programs(300)
+
+
+# Every mode must give the value the derivation rules give.
+@pytest.mark.parametrize('program', PROGRAMS)
+def test_modes_agree(program):
+    expected, _ = Compiler.eval_expr('', program, EvalMode.DERIVATION)
+    for mode in EvalMode:
+        value, _ = Compiler.eval_expr('', program, mode)
+        assert value == expected and type(value) is type(expected), (mode, program)
+
+
+# Native code for the folded program calls the literal 3, which Python flags with a SyntaxWarning as it compiles.
+@pytest.mark.filterwarnings('ignore::SyntaxWarning')
+@pytest.mark.parametrize('mode', list(EvalMode))
+def test_applying_a_value_that_is_not_a_function(mode):
+    with pytest.raises(TypeError):
+        Compiler.eval_expr('', 'let x = 3 in x 4', mode)
+
+
+# Stack mode must not recurse anywhere, including in the optimizer.
+def test_stack_mode_on_a_deep_program():
+    value, _ = Compiler.eval_expr('', '1' + ' + 1' * 5000, EvalMode.STACK)
+    assert value == 5001
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.func_builder import CORPUS
+from services.helpers.func_builder.compiler import Compiler, EvalMode
+from services.helpers.func_builder.derivation import render_derivation
+from services.helpers.func_builder.memo import JudgmentCache
+
+FIB = 'let rec fib = fun n -> if n < 2 then n else fib (n - 1) + fib (n - 2) in fib 12'
+
+
+# Reused judgments must not change what a program evaluates to, nor the text of its derivation.
+@pytest.mark.parametrize('program', list(CORPUS.values()) + [FIB])
+def test_cached_derivation_is_unchanged(program):
+    expected_value, expected = Compiler.eval_expr('', program)
+    cache = JudgmentCache(derivations=True)
+    for _ in range(2):
+        value, derivation = Compiler.eval_expr('', program, cache=cache)
+        assert value == expected_value
+        assert render_derivation(derivation) == render_derivation(expected)
+
+
+def test_repeated_calls_hit():
+    cache = JudgmentCache()
+    assert Compiler.eval_expr('', FIB, EvalMode.VALUE, cache)[0] == 144
+    first = cache.stats()
+    assert Compiler.eval_expr('', FIB, EvalMode.VALUE, cache)[0] == 144
+    second = cache.stats()
+    assert second['hits'] > first['hits'] and second['misses'] == first['misses']
+
+
+def test_limits_are_kept():
+    by_entries = JudgmentCache(max_entries=5)
+    by_bytes = JudgmentCache(max_bytes=4096, derivations=True)
+    for n in range(12):
+        Compiler.eval_expr('', FIB.replace('12', str(n)), EvalMode.VALUE, by_entries)
+        Compiler.eval_expr('', FIB.replace('12', str(n)), EvalMode.DERIVATION, by_bytes)
+        assert len(by_entries) <= 5
+        assert by_bytes.stats()['bytes'] <= 4096
+    assert by_entries.stats()['evictions'] > 0 and by_bytes.stats()['evictions'] > 0
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from helpers.nystrom import LandmarkSampling, nystrom_error
+from helpers.spectral import (EigenSolver, SpectralTracker, batched_embeddings, batched_laplacian,
+                              laplacian_eigenpairs, normalized_laplacian)
+
+
+def random_graph(n, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = rng.random((n, n))
+    return (weights + weights.T) / 2
+
+
+# A sparse ring with random chords, so that the iterative solvers apply.
+def sparse_graph(n, seed=0):
+    rng = np.random.default_rng(seed)
+    chords = sp.random(n, n, density=4 / n, random_state=rng)
+    ring = sp.diags([np.ones(n - 1)], [1], shape=(n, n))
+    graph = chords + ring
+    return (graph + graph.T).tocsr()
+
+
+# Dense graph of k clusters, whose nodes are joined much more strongly within a cluster than across.
+def clustered_graph(n, k, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(k, size=n)
+    weights = np.where(labels[:, None] == labels[None, :], 1.0, 0.05) * rng.random((n, n))
+    weights = (weights + weights.T) / 2
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+# Sine of the largest principal angle between the column spans of a and b.
+def subspace_sine(a, b):
+    cosines = np.linalg.svd(a.T @ b, compute_uv=False)
+    return float(np.sqrt(max(0.0, 1 - cosines.min() ** 2)))
+
+
+def test_batched_laplacian_matches_scipy():
+    graphs = np.stack([random_graph(6, seed) for seed in range(3)])
+    graphs[1, 2, 2] = 5  # A self-loop, which is ignored.
+    graphs[2, 4, :] = graphs[2, :, 4] = 0  # An isolated node.
+    for graph, lap in zip(graphs, batched_laplacian(graphs)):
+        assert np.allclose(lap, normalized_laplacian(graph).toarray())
+
+
+def test_batched_embeddings_match_one_at_a_time():
+    tensors = [random_graph(20, seed) for seed in range(4)] + [random_graph(30, 4), sparse_graph(40)]
+    for tensor, embedding in zip(tensors, batched_embeddings(tensors, 3)):
+        _, expected = laplacian_eigenpairs(tensor, 3, EigenSolver.DENSE)
+        assert embedding.shape == expected.shape
+        assert subspace_sine(embedding, expected) < 1e-6
+
+
+@pytest.mark.parametrize('solver', [EigenSolver.EIGSH, EigenSolver.SHIFT_INVERT, EigenSolver.LOBPCG])
+def test_iterative_solvers_match_dense(solver):
+    graph = sparse_graph(300)
+    expected, _ = laplacian_eigenpairs(graph, 4, EigenSolver.DENSE)
+    eigenvalues, eigenvectors = laplacian_eigenpairs(graph, 4, solver, dense_threshold=50, tol=1e-10)
+    assert np.allclose(eigenvalues, expected, atol=1e-6)
+    lap = normalized_laplacian(graph)
+    assert np.linalg.norm(lap @ eigenvectors - eigenvectors * eigenvalues) < 1e-4
+
+
+# Each update must give the eigenvalues a cold solve gives, whichever path the tracker takes.
+def test_tracker_follows_a_changing_graph():
+    rng = np.random.default_rng(1)
+    graph = sparse_graph(300)
+    tracker = SpectralTracker(tol=1e-8, dense_threshold=50)
+    for step in range(4):
+        eigenvalues, _ = tracker.update(graph, 4)
+        expected, _ = laplacian_eigenpairs(graph, 4, EigenSolver.DENSE)
+        assert np.allclose(eigenvalues, expected, atol=1e-6)
+        graph = graph + sp.diags([rng.random(299) * 10 ** -step], [1], shape=graph.shape)
+        graph = ((graph + graph.T) / 2).tocsr()
+
+    methods = [record['method'] for record in tracker.history]
+    assert methods[0] == 'cold' and all(method in ('perturbation', 'warm') for method in methods[1:])
+    assert all(record['residual'] < 1e-6 for record in tracker.history)
+
+
+# The eigenvalue error stays within its a posteriori bound, and a clustered graph is embedded accurately.
+@pytest.mark.parametrize('sampling', list(LandmarkSampling))
+def test_nystrom_error_on_clustered_graph(sampling):
+    error = nystrom_error(clustered_graph(400, 4), 4, 60, sampling, seed=1)
+    assert error['landmarks'] == 60
+    assert error['eigenvalue_error'] <= error['residual_bound'] + 1e-12
+    assert error['eigenvalue_error'] < 1e-2 and error['subspace_sine'] < 0.2
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from services.helpers.func_builder.compiler import Compiler, EvalMode
+from services.helpers.func_builder.vectorized import apply_batch, eval_batch
+
+INPUTS = np.arange(-3, 9)
+
+# Programs of x; the let rec ones recurse to a depth that differs between the elements of the batch.
+PROGRAMS = [
+    'x * x - 2 * x + 1',
+    'if x < 3 then x else 0 - x',
+    'let y = x * 2 in if y < x then 1 else y',
+    'let rec f = fun n -> if n < 1 then 0 else n + f (n - 1) in f x',
+    'let rec fib = fun n -> if n < 2 then n else fib (n - 1) + fib (n - 2) in fib x',
+    'let f = fun a -> fun b -> a * b + x in f x 3',
+]
+
+
+def interpreted(environment, expr):
+    return Compiler.eval_expr(environment, expr, EvalMode.VALUE)[0]
+
+
+# A batch gives element by element what the interpreter gives for each input.
+@pytest.mark.parametrize('program', PROGRAMS)
+def test_eval_batch_matches_interpreter(program):
+    result = eval_batch(Compiler.parse(program, ('x',)), x=INPUTS)
+    expected = [interpreted(f'x = {value}', program) for value in INPUTS]
+    assert np.broadcast_to(result, INPUTS.shape).tolist() == expected
+
+
+def test_apply_batch_matches_interpreter():
+    program = 'fun n -> if n < k then n * k else n - k'
+    result = apply_batch(Compiler.parse(program, ('k',)), INPUTS, k=4)
+    assert result.tolist() == [interpreted('k = 4', f'({program}) ({value})') for value in INPUTS]